@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import argparse
+import traceback
+import multiprocessing
+from itertools import islice
+
+from src.batch import Manifest, Source, iter_sources
+from src.pool import MessagePool
+from src.export import export_rate_tables
+from src.models import EmailData
+from src.pipeline import Pipeline
+from src.parameters import MESSAGE_POOL_WORKERS, BATCH_CHUNK_SIZE
+
+
+def export_tables(email_data: EmailData, extension: str, folder: str, filename: str) -> list[str]:
+    """Стадия export без вывода в консоль на каждое письмо: записанные файлы перечисляются в .log письма"""
+    if not email_data.rate_tables:
+        return []
+    return export_rate_tables(email_data.rate_tables, extension, folder, filename)
+
+
+PIPELINE = Pipeline(export=export_tables)
+
+
+def save_result(source: Source, message_result: dict, output_folder: str, extension: str, written: set) -> int:
+    """
+    Таблицы письма (<output>_<i>.<extension>) и журнал (<output>.log) в папке выгрузки; возвращает число таблиц;
+    written - результаты, уже записанные в этом запуске: письмо с тем же путем результата не перезаписывает их
+    """
+
+    output_root = os.path.abspath(output_folder)
+    output_path = os.path.abspath(os.path.join(output_root, source.output))
+    if os.path.commonpath([output_root, output_path]) != output_root:
+        raise ValueError(f'Путь результата {output_path} вне папки выгрузки {output_root}')
+    if os.path.normcase(output_path) in written:
+        raise ValueError(f'Результат {output_path} уже записан другим письмом в этом запуске')
+    written.add(os.path.normcase(output_path))
+    folder, filename = os.path.split(output_path)
+    os.makedirs(folder, exist_ok=True)
+    email_data = message_result['email_data']
+    log = list(message_result['log'])
+    written = [] if email_data is None else PIPELINE.export(email_data, extension, folder, filename)
+    log += [f"Таблица {i} записана в {file_path}\n" for i, file_path in enumerate(written)]
+    with open(os.path.join(folder, f'{filename}.log'), 'w', encoding='utf-8') as file:
+        file.writelines(log)
+    return len(written)
+
+
+def run(inputs: list[str], output_folder: str, workers: int | None, extension: str, manifest: Manifest) -> None:
+    """Обрабатывает письма, которых нет в манифесте, пачками по BATCH_CHUNK_SIZE и печатает пропускную способность"""
+
+    sources = iter_sources(inputs, skip=manifest)
+    skipped = len(manifest.done)
+    processed = size = tables = 0
+    written = set()
+
+    t0 = time.perf_counter()
+    with MessagePool(workers=workers, pipeline=PIPELINE) as pool:
+        while chunk := list(islice(sources, BATCH_CHUNK_SIZE)):
+            results = pool.process(source.message for source in chunk)
+            for source, message_result in zip(chunk, results):
+                try:
+                    message_tables = save_result(source, message_result, output_folder, extension, written)
+                    status = 'ok' if message_result['error'] is None else 'error'
+                except (OSError, ValueError):
+                    print(traceback.format_exc())
+                    message_tables, status = 0, 'error'
+                manifest.add(source.key, status, message_tables, source.size)
+                processed += 1
+                size += source.size
+                tables += message_tables
+            manifest.flush()
+            elapsed = time.perf_counter() - t0
+            print(f"Обработано писем: {processed} ({processed / elapsed:.1f} писем/с), таблиц: {tables}")
+        counters = pool.counters
+    elapsed = time.perf_counter() - t0
+
+    print(f"Готово: {processed} писем ({size / 2 ** 20:.1f} MB) за {elapsed:.1f}s; "
+          f"в манифесте до запуска: {skipped}")
+    print(f"Пропускная способность: {processed / elapsed if elapsed else 0:.1f} писем/с, "
+          f"{size / 2 ** 20 / elapsed if elapsed else 0:.2f} MB/с")
+    print(f"Таблиц ставок: {tables}, ошибок: {counters['errors']}, "
+          f"отсеяно быстрой проверкой: {counters['prefiltered']}")
+    print(f"Время по стадиям в этом процессе (с -w 0 - все стадии):\n{PIPELINE.report()}")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # пул процессов в сборке PyInstaller
+
+    parser = argparse.ArgumentParser(description="Пакетная обработка .msg / .eml писем: папки, шаблоны glob, "
+                                                 "zip и mbox архивы")
+    parser.add_argument("inputs", nargs='+', help="Папки, шаблоны (например, 'archive/**/*.msg'), .zip, .mbox, файлы")
+    parser.add_argument("-o", "--output", required=True, help="Папка выгрузки (.xml / .csv, .log и manifest.jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=MESSAGE_POOL_WORKERS,
+                        help="Число процессов (0 - в текущем процессе; по умолчанию - по числу процессоров)")
+    parser.add_argument("--format", choices=('xml', 'csv'), default='xml', help="Формат таблиц ставок")
+    parser.add_argument("--retry-errors", action="store_true", help="Повторить письма, обработанные с ошибкой")
+    args = parser.parse_args()
+
+    missing = [path for path in args.inputs if not os.path.exists(path) and not any(c in path for c in '*?[')]
+    if missing:
+        print(f"Не найдены: {', '.join(missing)}")
+        sys.exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    with Manifest(os.path.join(args.output, 'manifest.jsonl'), retry_errors=args.retry_errors) as manifest:
+        run(args.inputs, args.output, args.workers, args.format, manifest)
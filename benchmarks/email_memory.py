@@ -0,0 +1,58 @@
+""" Память на пачку больших писем: EmailData с промежуточными результатами (debug) и без них
+
+Как в main.process_messages, результаты всей пачки держатся в списке; в режиме debug дерево разбора
+освобождается release_parse_tree(), как в рабочем процессе пула
+
+Запуск: python -m benchmarks.email_memory
+"""
+
+import gc
+import time
+import tracemalloc
+
+from src.models import EmailData
+from src.logger import logger
+from benchmarks.synthetic import RATE_TABLE, LAYOUT_TABLE, REPLY_HEADER, synthetic_thread
+
+MESSAGES = 10
+
+
+def large_message(i: int) -> str:
+    """Последнее письмо цепочки - ~80 KB (таблицы ставок и текст), ниже - история из 100 таблиц"""
+    paragraph = f'<p>Письмо {i}: условия перевозки, сроки, требования к документам. </p>\n' * 20
+    last_message = (RATE_TABLE + LAYOUT_TABLE + paragraph) * 40
+    return f'<html><body><div>{last_message}{REPLY_HEADER}</div>{synthetic_thread(100)}</body></html>'
+
+
+def process_batch(corpus: list[str], debug: bool) -> list[EmailData]:
+    result = []
+    for html in corpus:
+        email_data = EmailData(debug=debug)
+        email_data.html = html.encode().decode()  # как после декодирования письма: своя копия html
+        email_data.rate_tables_processor()
+        email_data.release_parse_tree()
+        result.append(email_data)
+        logger.clear()
+    return result
+
+
+def measure(corpus: list[str], debug: bool) -> tuple[float, float, float]:
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = process_batch(corpus, debug)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 2 ** 20, peak / 2 ** 20, elapsed
+
+
+if __name__ == '__main__':
+    corpus = [large_message(i) for i in range(MESSAGES)]
+    size = sum(map(len, corpus)) / 2 ** 20
+    print(f'{MESSAGES} писем, всего {size:.1f} MB html')
+    for debug in (True, False):
+        current, peak, elapsed = measure(corpus, debug)
+        print(f'debug={debug!s:<5}: удерживается {current:6.2f} MB, пик {peak:6.2f} MB, {elapsed:.2f}s')
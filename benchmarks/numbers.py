@@ -0,0 +1,104 @@
+""" Извлечение чисел из ячеек "ставка" / "вход" на 100k строк: прежние функции против текущих
+
+Заодно проверка свойства на случайных строках: там, где прежние функции разбирали число верно
+(нет запятых, не больше одной точки в числе и не "1.200" - разделитель тысяч), результат совпадает;
+для запятых и разделителей тысяч - сверка с таблицей ожидаемых значений;
+Ускорения нет: текущие функции чуть медленнее прежних (около 0.7-1.1x, в среднем 0.9x) за счет разбора разделителей;
+векторный разбор столбца через pandas .str (строки object) оказался еще медленнее (0.7x) и удален
+
+Запуск: python -m benchmarks.numbers
+"""
+
+import re
+import math
+import time
+import random
+
+from src.utils import extract_first_number, extract_number_from_entry
+
+
+def old_extract_first_number(text: str) -> float | None:
+    """Прежняя реализация"""
+    regex = r'^.*?(\d+(?:\.\d+)?).*$'
+    text = re.sub(r'[^\S\n]', '', text)
+    matches = re.findall(regex, text, flags=re.MULTILINE)
+    if matches:
+        return float(matches[0])
+
+
+def old_extract_number_from_entry(text: str) -> float | None:
+    if '=' in text:
+        last_equal = list(re.finditer(r'=', text))[-1]
+        text = text[last_equal.start():]
+    return old_extract_first_number(text)
+
+
+EXPECTED = {
+    '1 200,50 USD': 1200.5, '1\xa0200,50': 1200.5, '1,200.50': 1200.5, '1.200,50': 1200.5, '1,200,000': 1200000,
+    '1.200.000': 1200000, '1.200.000,5': 1200000.5, '1,200,000.5': 1200000.5, '0,125': 0.125, '1,2': 1.2,
+    '1200,5$': 1200.5, '12345,5': 12345.5, 'от 5,5 до 7': 5.5, '1.5': 1.5, '1,200': 1200, '2,500 USD': 2500,
+    '1.200': 1200, '12,345': 12345, '999,000': 999000, '0,500': 0.5, '1,2005': 1.2005, '1234,567': 1234.567,
+    'нет': None, '40HC = 1 500,00': 40.0, 'дата 01.02.2024': 1.02,
+    '100, 200': 100, '1500, 2000': 1500, '1 500, 2 000': 1500, '5,5 , 6': 5.5, '1. 5': 1, '7 ,5': 7,
+}
+EXPECTED_ENTRY = {'20DC=1 500,00': 1500.0, '100 = 1.200.000': 1200000, 'a=b=3,5': 3.5, '7,5': 7.5, 'x=': None,
+                  '40HC = 2,500': 2500}
+
+ALPHABET = '0123456789012345678.,. =\n\tabcUSD$₽'
+
+
+def same(a, b) -> bool:
+    if a is None or (isinstance(a, float) and math.isnan(a)):
+        return b is None or (isinstance(b, float) and math.isnan(b))
+    return b is not None and math.isclose(a, b)
+
+
+def random_cell(rnd: random.Random) -> str:
+    return ''.join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 20)))
+
+
+def first_token(text: str) -> str:
+    """Первое число так, как его видели прежние функции: цифры, разделители и пробелы между ними"""
+    match = re.search(r'\d(?:[\d.,]|[^\S\n])*', text)
+    return match.group().rstrip() if match else ''
+
+
+def check_properties(cases: int = 50_000) -> None:
+    rnd = random.Random(0)
+    cells = [random_cell(rnd) for _ in range(cases)]
+    for extract, old in ((extract_first_number, old_extract_first_number),
+                         (extract_number_from_entry, old_extract_number_from_entry)):
+        for cell in cells:
+            token = first_token(cell.rpartition('=')[2] if extract is extract_number_from_entry else cell)
+            spaced_separator = re.search(r'[.,][^\S\n]|[^\S\n][.,]', token)  # "100, 200" - два числа
+            token = re.sub(r'[^\S\n]', '', token)
+            if (',' not in token and token.count('.') <= 1 and not spaced_separator
+                    and not re.match(r'[1-9]\d{0,2}\.\d{3}(?!\d)', token)):
+                assert same(old(cell), extract(cell)), (cell, old(cell), extract(cell))
+
+    for expected, extract in ((EXPECTED, extract_first_number), (EXPECTED_ENTRY, extract_number_from_entry)):
+        for cell, value in expected.items():
+            assert same(value, extract(cell)), (cell, value, extract(cell))
+    print(f'Свойства проверены на {cases} случайных строках')
+
+
+def build_column(rows: int) -> list[str]:
+    rnd = random.Random(1)
+    templates = ['{} USD', '{} руб.', 'ставка {}\nдоп. 100', '40HC = {}', '{}', 'от {} за контейнер']
+    return [rnd.choice(templates).format(f'{rnd.randint(1, 300000):,}'.replace(',', rnd.choice(' ,')))
+            for _ in range(rows)]
+
+
+if __name__ == '__main__':
+    check_properties()
+    rows = 100_000
+    column = build_column(rows)
+    for name, old, new in (('ставка', old_extract_first_number, extract_first_number),
+                           ('вход', old_extract_number_from_entry, extract_number_from_entry)):
+        t0 = time.perf_counter()
+        [old(cell) for cell in column]
+        old_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        [new(cell) for cell in column]
+        new_time = time.perf_counter() - t0
+        print(f'{name}: {rows} строк, прежние {old_time:.2f}s, текущие {new_time:.2f}s, {old_time / new_time:.1f}x')
@@ -0,0 +1,48 @@
+""" Время по стадиям конвейера (decode -> split -> detect -> normalize -> export) на синтетических письмах
+
+Письма - байты RFC 822 (как после IMAP FETCH), кэш результатов отключен; для примера замены стадии
+detect сравнивается с прежним чтением всех строк каждой таблицы
+
+Запуск: python -m benchmarks.pipeline
+"""
+
+import tempfile
+
+from src.logger import logger
+from src.sources import RawMessage
+from src.pipeline import Pipeline
+from benchmarks.synthetic import synthetic_thread
+from benchmarks.table_reader import layout_table, read_all_rows
+
+MESSAGES = 200
+
+
+def raw_message(i: int) -> bytes:
+    html = synthetic_thread(6).replace('<div>', '<div>' + layout_table(20), 1)
+    return (f'From: sender{i % 10}@example.com\r\nSubject: Rates {i}\r\n'
+            f'Content-Type: text/html; charset=utf-8\r\n\r\n{html}').encode('utf-8')
+
+
+def detect_all_rows(spans) -> list:
+    """Прежний detect: все строки каждой таблицы, затем проверка заголовка"""
+    return [rows for rows in (read_all_rows(table['node']) for table in spans.tables) if rows is not None]
+
+
+def run(pipeline: Pipeline, sources: list[RawMessage], folder: str) -> None:
+    for i, source in enumerate(sources):
+        email_data = pipeline.process(source)
+        pipeline.export(email_data, 'csv', folder, f'message{i}')
+        logger.clear()
+
+
+if __name__ == '__main__':
+    sources = [RawMessage(raw_message(i), f'message{i}') for i in range(MESSAGES)]
+    print(f'{MESSAGES} писем, {sum(source.size for source in sources) / 2 ** 20:.1f} MB')
+
+    with tempfile.TemporaryDirectory() as folder:
+        for name, pipeline in (('detect по умолчанию', Pipeline(use_cache=False)),
+                               ('detect: все строки', Pipeline(detect=detect_all_rows, use_cache=False))):
+            run(pipeline, sources, folder)
+            print(f'\n{name}: всего {sum(pipeline.timings.values()):.2f}s')
+            print(pipeline.report())
+    logger.flush()
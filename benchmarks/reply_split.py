@@ -0,0 +1,84 @@
+""" Фазз-проверка и замеры времени движка заголовков ответа (src/reply_headers.py)
+
+1) На случайных текстах диалекты по умолчанию (outlook_en/outlook_ru) дают то же, что исходное
+   регулярное выражение split_html;
+2) На патологических входах (минифицированный html без переводов строк) время растет линейно
+   для всех диалектов, включая дополнительные (REPLY_HEADER_OPTIONAL_DIALECTS)
+
+Запуск: python -m benchmarks.reply_split
+"""
+
+import re
+import time
+import random
+
+from src.parameters import REPLY_HEADER_DIALECTS, REPLY_HEADER_OPTIONAL_DIALECTS
+from src.reply_headers import ReplyHeaderEngine, ReplyBoundaryScanner
+
+OLD_REGEX = (r'(?:.*sent:.*$\s)(?:.*to:.*$\s)(?:.*cc:.*$\s)?(?:.*subject:.*$)'
+             r'|'
+             r'(?:.*отправлено:.*$\s)(?:.*кому:.*$\s)(?:.*копия:.*$\s)?(?:.*тема:.*$)')
+
+FRAGMENTS = ['Sent: x', 'To: y', 'Cc: z', 'Subject: s', 'SENT:', 'Отправлено: 1', 'КОМУ: a', 'Копия: b',
+             'Тема: t', '\n', '\n', '\n', '\r\n', 'text', 'sent: to: subject:', 'cc:']
+
+PATHOLOGICAL = {
+    'sent_to_no_subject': 'sent: to: ',
+    'markers_without_newlines': 'sent: to: cc: subject: отправлено: кому: ',
+    'plain_minified_html': '<td><p>ставка</p></td>',
+}
+
+
+def old_split(text: str) -> list[str]:
+    return re.split(OLD_REGEX, text, flags=re.IGNORECASE | re.MULTILINE)
+
+
+def fuzz(iterations: int = 20000, seed: int = 0) -> None:
+    legacy = ReplyHeaderEngine(REPLY_HEADER_DIALECTS)
+    rnd = random.Random(seed)
+    for _ in range(iterations):
+        text = ''.join(rnd.choice(FRAGMENTS) for _ in range(rnd.randint(0, 20)))
+        expected = old_split(text)
+        assert legacy.split(text) == expected, repr(text)
+
+        # потоковый сканер на случайном разбиении текста на куски
+        scanner = ReplyBoundaryScanner(legacy)
+        boundary, position = None, 0
+        while boundary is None and position < len(text):
+            size = rnd.randint(1, 8)
+            boundary = scanner.feed(text[position:position + size])
+            position += size
+        if boundary is None:
+            boundary = scanner.close()
+        assert (text if boundary is None else text[:boundary]) == expected[0], repr(text)
+    print(f'fuzz: {iterations} случайных текстов совпали с исходным регулярным выражением')
+
+
+def timing(func, text: str, repeat: int = 3) -> float:
+    """Лучшее время из repeat запусков"""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def linear_time_check(sizes=(250_000, 500_000, 1_000_000, 2_000_000), max_ratio: float = 3.0) -> None:
+    engine = ReplyHeaderEngine(dict(REPLY_HEADER_DIALECTS, **REPLY_HEADER_OPTIONAL_DIALECTS))
+    for name, unit in PATHOLOGICAL.items():
+        times = [timing(engine.split, unit * (size // len(unit))) for size in sizes]
+        ratios = [b / a for a, b in zip(times, times[1:])]
+        print(f'{name:>26}: ' + ' '.join(f'{t:.4f}s' for t in times)
+              + ' | рост при удвоении: ' + ' '.join(f'{r:.1f}x' for r in ratios))
+        assert max(ratios) < max_ratio, f'{name}: сверхлинейный рост времени'
+
+    # исходное регулярное выражение на тех же входах (меньшие размеры - время растет сверхлинейно)
+    for name, unit in PATHOLOGICAL.items():
+        times = [timing(old_split, unit * (size // len(unit)), repeat=1) for size in (250, 500, 1_000)]
+        print(f'{name:>26} (old regex): ' + ' '.join(f'{t:.4f}s' for t in times))
+
+
+if __name__ == '__main__':
+    fuzz()
+    linear_time_check()
@@ -0,0 +1,74 @@
+""" Классификация 100k наименований услуг: прежний service_replace_by_service1C против KeywordMatcher
+
+Словарь ключевых слов расширяется синтетическими (порты, перевозчики, синонимы) до нескольких сотен;
+для каждого размера замеряются оба пути KeywordMatcher - поиск `in` по словам и автомат Ахо-Корасик:
+по точке, где автомат начинает выигрывать, выбран порог linear_scan_limit
+
+Запуск: python -m benchmarks.services_matcher
+"""
+
+import time
+import random
+
+from src.matcher import KeywordMatcher
+from src.parameters import SERVICES_KEYWORDS
+
+PORTS = ['владивосток', 'новороссийск', 'санкт-петербург', 'восточный', 'находка', 'шанхай', 'нинбо', 'циндао',
+         'пусан', 'гамбург', 'роттердам', 'стамбул', 'мерсин', 'джебель-али', 'нава-шева', 'сингапур']
+CARRIERS = ['fesco', 'maersk', 'msc', 'cma cgm', 'cosco', 'one', 'hmm', 'evergreen', 'zim', 'sasco', 'yang ming']
+WORDS = ['ставка', 'контейнер', '40hc', '20dc', 'порт', 'выгрузка', 'погрузка', 'станция', 'терминал', 'охрана',
+         'хранение', 'документы', 'оформление', 'сбор', 'thc', 'baf', 'caf', 'доплата']
+
+
+def service_replace_by_service1C(service: str, keyword_dict: dict) -> str:
+    """Прежняя реализация: ключевые слова проверяются по очереди"""
+    service_lower = service.lower()
+    for key_word, name1C in keyword_dict.items():
+        if key_word in service_lower:
+            return name1C
+    return ''
+
+
+def build_keywords(size: int) -> dict:
+    """SERVICES_KEYWORDS + синтетические ключевые слова (они стоят в словаре после исходных)"""
+    keywords = dict(SERVICES_KEYWORDS)
+    services = list(dict.fromkeys(SERVICES_KEYWORDS.values()))
+    rnd = random.Random(1)
+    while len(keywords) < size:
+        key_word = f'{rnd.choice(WORDS)} {rnd.choice(PORTS + CARRIERS)} {rnd.randint(1, 99)}'
+        keywords.setdefault(key_word, rnd.choice(services))
+    return keywords
+
+
+def build_column(rows: int, keywords: dict) -> list[str]:
+    rnd = random.Random(2)
+    key_words = list(keywords)
+    cells = []
+    for i in range(rows):
+        words = [rnd.choice(WORDS), rnd.choice(PORTS), rnd.choice(CARRIERS), str(i)]
+        if rnd.random() < 0.6:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(key_words).upper())
+        cells.append(' '.join(words))
+    return cells
+
+
+def measure(classify, column: list[str]) -> tuple[float, list[str]]:
+    t0 = time.perf_counter()
+    result = [classify(text) for text in column]
+    return time.perf_counter() - t0, result
+
+
+if __name__ == '__main__':
+    rows = 100_000
+    for size in (len(SERVICES_KEYWORDS), 32, 64, 96, 128, 256, 512):
+        keywords = build_keywords(size)
+        column = build_column(rows, keywords)
+
+        old_time, old = measure(lambda text: service_replace_by_service1C(text, keywords), column)
+        linear_time, linear = measure(KeywordMatcher(keywords, linear_scan_limit=len(keywords)).classify, column)
+        automaton_time, automaton = measure(KeywordMatcher(keywords, linear_scan_limit=0).classify, column)
+        default_time, default = measure(KeywordMatcher(keywords).classify, column)
+
+        assert old == linear == automaton == default, 'Результаты классификации различаются'
+        print(f'{len(keywords):>4} ключевых слов, {rows} строк: прежний {old_time:.2f}s, in {linear_time:.2f}s, '
+              f'автомат {automaton_time:.2f}s, KeywordMatcher {default_time:.2f}s ({old_time / default_time:.1f}x)')
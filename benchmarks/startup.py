@@ -0,0 +1,99 @@
+""" Время запуска: импорт модулей точек входа (отчет -X importtime) и холодный запуск main2 на небольшом письме
+
+main2 запускается интеграцией Outlook отдельным процессом на каждый .msg файл, поэтому время импорта
+оплачивается на каждом файле; тяжелые библиотеки (pandas, chardet, extract_msg, cryptography) должны
+загружаться только там, где они нужны
+
+Запуск: python -m benchmarks.startup [путь к .msg]
+(с .msg файлом замеряется python main2.py <файл>; результат .xml и .log пишутся рядом с файлом)
+"""
+
+import re
+import sys
+import time
+import subprocess
+
+ENTRY_MODULES = ('main2', 'main3', 'main')
+HEAVY_MODULES = ('pandas', 'bs4', 'lxml', 'chardet', 'extract_msg', 'cryptography')
+TOP = 10
+RUNS = 3
+
+_IMPORT_TIME_REGEX = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| \s*(\S+)$')
+
+# Небольшое письмо без .msg файла: то же, что делает main2 после чтения файла
+SMALL_MESSAGE = """
+import extract_msg
+import main2
+from src.models import EmailData
+from benchmarks.synthetic import RATE_TABLE, REPLY_HEADER
+
+email_data = EmailData()
+email_data.html = '<html><body><p>Добрый день</p>' + RATE_TABLE + REPLY_HEADER + RATE_TABLE + '</body></html>'
+email_data.rate_tables_processor()
+assert len(email_data.rate_tables) == 1
+"""
+
+
+def import_times(module: str) -> tuple[dict[str, int], list[tuple[str, int, int]], str]:
+    """
+    Импорт модуля в отдельном процессе с -X importtime:
+    время (мкс, с вложенными импортами) по пакетам верхнего уровня, строки отчета (модуль, собственное, общее)
+    и текст ошибки импорта (пустой, если импорт удался)
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             capture_output=True, text=True)
+    packages: dict[str, int] = {}
+    rows = []
+    other = []
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME_REGEX.match(line)
+        if not match:
+            other.append(line)
+            continue
+        self_us, cumulative_us, name = int(match[1]), int(match[2]), match[3]
+        rows.append((name, self_us, cumulative_us))
+        package = name.partition('.')[0]
+        if package != module:
+            # внешний импорт пакета (наибольшее общее время) включает все его подмодули
+            packages[package] = max(packages.get(package, 0), cumulative_us)
+    error = '' if process.returncode == 0 else (other[-1] if other else f'код возврата {process.returncode}')
+    return packages, rows, error
+
+
+def cold_run(args: list[str]) -> float:
+    """Лучшее из RUNS время работы процесса (с), включая запуск интерпретатора"""
+    best = float('inf')
+    for _ in range(RUNS):
+        t0 = time.perf_counter()
+        subprocess.run(args, check=True, capture_output=True)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def report_imports(module: str) -> None:
+    packages, rows, error = import_times(module)
+    if error:
+        print(f'{module}: импорт не удался: {error}\n')
+        return
+
+    total = next(cumulative for name, _, cumulative in reversed(rows) if name == module)
+    print(f'{module}: импорт {total / 1000:.0f} ms')
+    loaded = [name for name in HEAVY_MODULES if name in packages]
+    print(f'  загружены при импорте: {", ".join(loaded) or "-"}')
+    for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:TOP]:
+        print(f'  {name:<28} {cumulative / 1000:8.1f} ms')
+    print()
+
+
+if __name__ == '__main__':
+    for entry_module in ENTRY_MODULES:
+        report_imports(entry_module)
+
+    interpreter = cold_run([sys.executable, '-c', 'pass'])
+    print(f'интерпретатор без импортов: {interpreter:.3f}s')
+    if len(sys.argv) > 1:
+        elapsed = cold_run([sys.executable, 'main2.py', sys.argv[1]])
+        print(f'python main2.py {sys.argv[1]}: {elapsed:.3f}s')
+    else:
+        elapsed = cold_run([sys.executable, '-c', SMALL_MESSAGE])
+        print(f'main2 + extract_msg + небольшое письмо (без чтения .msg): {elapsed:.3f}s')
@@ -0,0 +1,31 @@
+""" Генерация синтетических html-цепочек писем для бенчмарков """
+
+RATE_TABLE = (
+    '<table border="1">\n'
+    '<tr><td><p>Наименование</p></td><td><p>Ставка</p></td><td><p>Вход</p></td></tr>\n'
+    '<tr><td><p>Фрахт</p></td><td><p>1 200 USD</p></td><td><p>100+20=120</p></td></tr>\n'
+    '<tr><td><p>Экспедирование</p></td><td>300</td><td>40.5 руб</td></tr>\n'
+    '<tr><td>Автовывоз</td><td>7 000</td><td>8</td></tr>\n'
+    '</table>\n'
+)
+
+LAYOUT_TABLE = '<table><tr><td>Подпись<table><tr><td>лого</td></tr></table></td><td>тел.</td></tr></table>\n'
+
+REPLY_HEADER = (
+    '<p><b>From:</b> Sender<br>\n'
+    '<b>Sent:</b> Monday, January 1, 2024<br>\n'
+    '<b>To:</b> Rates<br>\n'
+    '<b>Subject:</b> RE: ставки</p>\n'
+)
+
+
+def synthetic_thread(n_tables: int) -> str:
+    """ Цепочка ответов из n_tables таблиц: ставки и служебные таблицы, с заголовком ответа после каждой пары """
+
+    parts = ['<html><body><div>\n<p>Добрый день</p>\n']
+    for i in range(n_tables):
+        parts.append(RATE_TABLE if i % 2 == 0 else LAYOUT_TABLE)
+        if i % 2 == 1:
+            parts.append(REPLY_HEADER)
+    parts.append('</div></body></html>')
+    return ''.join(parts)
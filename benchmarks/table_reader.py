@@ -0,0 +1,55 @@
+""" Чтение верхнеуровневых таблиц письма-рассылки с тяжелой версткой: все строки каждой таблицы
+(html_table_rows + проверка заголовка) против двухфазного read_rate_table_rows
+
+Запуск: python -m benchmarks.table_reader
+"""
+
+import time
+
+from bs4 import Tag
+
+from src.parameters import FIELDS_ALIAS
+from src.utils import make_soup, iter_top_level_tables, table_row_cells, read_rate_table_rows, compare_fields_names
+from benchmarks.synthetic import RATE_TABLE
+
+
+def layout_table(rows: int) -> str:
+    """Таблица верстки рассылки: блоки с картинкой, текстом и ссылками"""
+    row = ('<tr><td><img src="banner.png"></td><td><p>Новости компании</p><p>Подробнее на сайте</p></td>'
+           '<td><a href="#">Читать</a></td><td>&nbsp;</td></tr>')
+    return f'<table width="600">{row * rows}</table>\n'
+
+
+def newsletter(tables: int, rows: int) -> str:
+    return f'<html><body>{layout_table(rows) * tables}{RATE_TABLE}</body></html>'
+
+
+def html_table_rows(table: Tag) -> list[list[str]]:
+    """Строки таблицы (первая - заголовок) как списки текстов ячеек; абзацы <p> в ячейке - через переносы строк"""
+    return [table_row_cells(tr) for tr in table.find_all('tr')]
+
+
+def read_all_rows(table) -> list | None:
+    """Прежний путь: все строки таблицы, затем проверка ширины и заголовка"""
+    rows = html_table_rows(table)
+    if not rows or max(map(len, rows)) != 3 or len(rows[0]) != 3:
+        return None
+    return rows if compare_fields_names(FIELDS_ALIAS, rows[0]) else None
+
+
+if __name__ == '__main__':
+    for tables, rows in ((10, 50), (50, 200)):
+        soup = make_soup(newsletter(tables, rows))
+        nodes = list(iter_top_level_tables(soup))
+
+        t0 = time.perf_counter()
+        old = [read_all_rows(node) for node in nodes]
+        old_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        new = [read_rate_table_rows(node) for node in nodes]
+        new_time = time.perf_counter() - t0
+
+        assert old == new, 'Результаты чтения таблиц различаются'
+        print(f'{tables} таблиц верстки x {rows} строк: все строки {old_time:.3f}s, '
+              f'двухфазно {new_time:.4f}s, {old_time / new_time:.0f}x')
@@ -0,0 +1,80 @@
+""" Поиск таблиц последнего письма: прежняя реализация против extract_last_message_spans (src/utils.py)
+на синтетических цепочках из 10/100/1000 таблиц
+
+Прежняя реализация: find_tables_positions (сериализует весь документ на каждую таблицу), замена всех таблиц
+на UUID и split_html по заголовкам ответа; текущая - extract_last_message_spans из программы: документ
+сериализуется один раз и просматривается только до первого заголовка ответа;
+Обе получают один и тот же уже разобранный soup (время разбора html не входит), результат - html последнего
+письма с таблицами - должен совпадать
+
+Запуск: python -m benchmarks.tables_positions (прежняя реализация на 1000 таблиц работает около 7 минут)
+"""
+
+import re
+import time
+from uuid import uuid4
+from bs4 import BeautifulSoup
+
+from benchmarks.synthetic import synthetic_thread
+from src.utils import extract_last_message_spans
+
+
+def find_tables_positions_old(soup: BeautifulSoup) -> list:
+    """ Исходная реализация: сериализует весь документ на каждую таблицу """
+
+    start = 0
+    tables_info = []
+    for table in soup.find_all('table'):
+        table_html = str(table)
+        find_ = str(soup).find(table_html, start)
+        if find_ != -1:
+            start = find_
+            end = find_ + len(table_html) - 1
+            end_of_last_table = tables_info[-1]['end'] if tables_info else 0
+            if end_of_last_table <= start:
+                tables_info.append({'table': table_html, 'start': start, 'end': end})
+    return tables_info
+
+
+def last_message_old(soup: BeautifulSoup) -> str:
+    """ Исходный порядок: позиции всех таблиц, замена всех таблиц на UUID, split_html, восстановление таблиц """
+
+    tables_info = find_tables_positions_old(soup)
+
+    text = str(soup)
+    last_end = 0
+    replacement = ''
+    for i, table in enumerate(tables_info):
+        table['_id'] = str(uuid4())
+        replacement += text[last_end:table['start']] + '\n' + table['_id'] + '\n'
+        last_end = table['end'] + 1
+        if i == len(tables_info) - 1:
+            replacement += text[table['end'] + 1:]
+
+    regex = (r'(?:.*sent:.*$\s)(?:.*to:.*$\s)(?:.*cc:.*$\s)?(?:.*subject:.*$)'
+             r'|'
+             r'(?:.*отправлено:.*$\s)(?:.*кому:.*$\s)(?:.*копия:.*$\s)?(?:.*тема:.*$)')
+    last_message = re.split(regex, replacement, flags=re.IGNORECASE | re.MULTILINE)[0]
+    for table in tables_info:
+        last_message = last_message.replace(table['_id'], table['table'])
+    return last_message
+
+
+def last_message_new(soup: BeautifulSoup) -> str:
+    return extract_last_message_spans(soup).restored()
+
+
+def measure(func, soup: BeautifulSoup) -> tuple[float, str]:
+    t0 = time.perf_counter()
+    result = func(soup)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == '__main__':
+    print(f"{'tables':>8} {'old, s':>10} {'new, s':>10} {'speedup':>8}")
+    for n_tables in (10, 100, 1000):
+        html = synthetic_thread(n_tables)
+        old_time, old_result = measure(last_message_old, BeautifulSoup(html, 'html.parser'))
+        new_time, new_result = measure(last_message_new, BeautifulSoup(html, 'html.parser'))
+        assert old_result == new_result, 'Результаты старой и новой реализации различаются'
+        print(f"{n_tables:>8} {old_time:>10.4f} {new_time:>10.4f} {old_time / new_time:>7.1f}x")
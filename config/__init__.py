@@ -1,47 +1,143 @@
+""" Настройки почтового ящика из зашифрованного encrypted.env (ключ - crypto.key)
+
+Файлы читаются и расшифровываются при первом обращении к настройке (config.EMAIL_ADDRESS), а не при импорте;
+расшифрованные настройки хранятся в памяти процесса, а при заданном CONFIG_CACHE_DIR (tmpfs, например /dev/shm)
+- еще и в файле, доступном только владельцу, в течение CONFIG_CACHE_TTL секунд для следующих процессов;
+Переменные окружения с теми же именами имеют приоритет: если заданы все SETTINGS, файлы не читаются
+"""
+
 import os
 import sys
-import msvcrt
+import time
+import stat
 from io import StringIO
-from dotenv import load_dotenv
-from cryptography.fernet import Fernet
+from typing import Optional
+
+CRYPTO_KEY_PATH = os.path.join(os.path.dirname(__file__), "crypto.key")
+CRYPTO_ENV = os.path.join(os.path.dirname(__file__), "encrypted.env")
 
+SETTINGS = ('EMAIL_ADDRESS', 'EMAIL_PASSWORD')
 
-try:
-    with open(os.path.join(os.path.dirname(__file__), "crypto.key"), 'r') as f:
-        CRYPTO_KEY = f.read()
-except FileNotFoundError as e:
-    print(e)
-    print(f'Не найден crypto.key в текущей папке {__name__}')
+# Кэш расшифрованных настроек в tmpfs (только POSIX): папка (None - не использовать) и время жизни файла, с
+CONFIG_CACHE_DIR: Optional[str] = os.getenv('RATES_CONFIG_CACHE_DIR')
+CONFIG_CACHE_TTL = float(os.getenv('RATES_CONFIG_CACHE_TTL', 300))
+CONFIG_CACHE_FILE = 'settings.env'
+
+_settings: Optional[dict] = None
+
+
+def _fail(message: str) -> None:
+    """Нет файла настроек: в собранном exe - сообщение и выход по нажатию клавиши, иначе - исключение"""
+    print(message)
     if getattr(sys, 'frozen', False):
-        msvcrt.getch()
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.getch()
+        elif sys.stdin is not None and sys.stdin.isatty():
+            input()
         sys.exit()
+    raise FileNotFoundError(message)
 
 
-CRYPTO_ENV = os.path.join(os.path.dirname(__file__), "encrypted.env")
+def _read(path: str, mode: str = 'rb'):
+    try:
+        with open(path, mode) as file:
+            return file.read()
+    except FileNotFoundError:
+        _fail(f'Файл {path} не найден.')
 
 
-def get_stream_dotenv():
+def get_stream_dotenv() -> StringIO:
     """ uses crypto.key to decrypt encrypted environment.
     returns StringIO (for load_dotenv(stream=...)"""
 
-    f = Fernet(CRYPTO_KEY)
+    from cryptography.fernet import Fernet
+
+    f = Fernet(_read(CRYPTO_KEY_PATH, 'r'))
+    decrypted_data = f.decrypt(_read(CRYPTO_ENV))  # bytes
+    decrypted_data_str = decrypted_data.decode('utf-8')  # string
+    return StringIO(decrypted_data_str)
+
+
+def _cache_path() -> Optional[str]:
+    """Файл кэша в CONFIG_CACHE_DIR; папка создается с правами 0700 и должна принадлежать текущему пользователю"""
+    if not CONFIG_CACHE_DIR or os.name != 'posix':
+        return None
+    os.makedirs(CONFIG_CACHE_DIR, mode=0o700, exist_ok=True)
+    info = os.stat(CONFIG_CACHE_DIR)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        print(f'Кэш настроек не используется: папка {CONFIG_CACHE_DIR} доступна не только владельцу')
+        return None
+    return os.path.join(CONFIG_CACHE_DIR, CONFIG_CACHE_FILE)
+
+
+def _read_cache(path: str) -> Optional[str]:
     try:
-        with open(CRYPTO_ENV, 'rb') as file:
-            encrypted_data = file.read()
+        if time.time() - os.stat(path).st_mtime > CONFIG_CACHE_TTL:
+            os.remove(path)
+            return None
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
     except FileNotFoundError:
-        print(f'Файл {CRYPTO_ENV} не найден.')
-        if getattr(sys, 'frozen', False):
-            msvcrt.getch()
-            sys.exit()
-        else:
-            raise
-    decrypted_data = f.decrypt(encrypted_data)  # bytes
-    decrypted_data_str = decrypted_data.decode('utf-8')  # string
-    string_stream = StringIO(decrypted_data_str)
-    return string_stream
+        return None
+
+
+def _write_cache(path: str, text: str) -> None:
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+def _load_file_settings() -> dict:
+    """Настройки из encrypted.env: из кэша в tmpfs, если он не устарел, иначе расшифровкой"""
+    from dotenv import dotenv_values
+
+    try:
+        cache_path = _cache_path()
+        text = cache_path and _read_cache(cache_path)
+    except OSError as e:
+        print(f'Кэш настроек не используется: {e}')
+        cache_path = text = None
+
+    if not text:
+        text = get_stream_dotenv().getvalue()
+        if cache_path:
+            try:
+                _write_cache(cache_path, text)
+            except OSError as e:
+                print(f'Кэш настроек не записан: {e}')
+
+    return dotenv_values(stream=StringIO(text))
+
+
+def load_settings() -> dict:
+    """Настройки SETTINGS (один раз на процесс): переменные окружения, недостающие - из encrypted.env"""
+    global _settings
+
+    if _settings is None:
+        settings = {name: os.environ[name] for name in SETTINGS if name in os.environ}
+        if len(settings) < len(SETTINGS):
+            settings = {**_load_file_settings(), **settings}
+        _settings = {name: settings.get(name) for name in SETTINGS}
+    return _settings
+
+
+def clear_cache() -> None:
+    """Сбрасывает настройки в памяти и файл кэша (например, после замены encrypted.env)"""
+    global _settings
 
+    _settings = None
+    if CONFIG_CACHE_DIR and os.name == 'posix':
+        try:
+            os.remove(os.path.join(CONFIG_CACHE_DIR, CONFIG_CACHE_FILE))
+        except FileNotFoundError:
+            pass
 
-load_dotenv(stream=get_stream_dotenv())
 
-EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
-EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+def __getattr__(name: str):
+    """config.EMAIL_ADDRESS, config.EMAIL_PASSWORD - при первом обращении (PEP 562)"""
+    if name in SETTINGS:
+        return load_settings()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,108 +1,169 @@
+import os
 import time
-import email
 import imaplib
 import traceback
+import multiprocessing
 from typing import Optional
-from email.message import Message
 
 import config
 from src.models import EmailData
-from src.utils import (connect_to_imap, get_unseen_messages, decode_subject, extract_text_content, extract_html_content,
-                       send_email, format_csv_to_table)
+from src.imap_worker import ImapWorker
+from src.smtp_sender import SmtpSender
+from src.pool import MessagePool
+from src.sources import RawMessage
+from src.pipeline import default_pipeline
+from src.logger import logger
+from src.export import CombinedCsvSink, export_name
+from src.parameters import (IMAP_FETCH_CHUNK_SIZE, MESSAGE_POOL_WORKERS, LOG_FILE, EXPORT_FOLDER, EXPORT_PER_MESSAGE,
+                            EXPORT_COMBINED_CSV, EXPORT_COMBINED_CSV_NAME)
+from src.utils import connect_to_imap, get_unseen_uids, fetch_messages_by_uid, mark_seen, send_email, format_csv_to_table
+
+
+def process_messages(mail: imaplib.IMAP4, message_uids: list[bytes], email_user: str, email_pass: str,
+                     fetch_chunk_size: int = IMAP_FETCH_CHUNK_SIZE,
+                     sender: Optional[SmtpSender] = None,
+                     pool: Optional[MessagePool] = None) -> list[EmailData]:
+    """
+    Обрабатывает письма с указанными UID в уже открытой IMAP-сессии;
+    Письма получаются пачками (UID FETCH по fetch_chunk_size), обработанные письма каждой пачки отмечаются прочитанными
+    одним UID STORE сразу после пачки;
+    Если передан pool, пачка обрабатывается параллельно; письмо, которое не удалось обработать, остается непрочитанным;
+    Если передан sender, ответные письма отправляются в фоне, иначе - сразу через send_email;
+    Таблицы дописываются в общий CSV за текущий день (EXPORT_COMBINED_CSV_NAME), а не в новый файл на каждый вызов
+    """
+
+    result = []
+    pool = pool or MessagePool(workers=0)
+    batch_name = export_name('batch')
+    combined = (CombinedCsvSink(os.path.join(EXPORT_FOLDER, time.strftime(EXPORT_COMBINED_CSV_NAME)), append=True)
+                if EXPORT_COMBINED_CSV else None)
+
+    try:
+        for start in range(0, len(message_uids), fetch_chunk_size):
+            # Получение пачки писем без отметки как прочитанное
+            chunk = list(fetch_messages_by_uid(mail, message_uids[start:start + fetch_chunk_size],
+                                               chunk_size=fetch_chunk_size))
+
+            # Парсинг писем и вычисление таблиц ставок (в порядке UID)
+            processed = pool.process([RawMessage(raw_message, f"uid{msg_uid.decode('utf-8')}")
+                                      for msg_uid, raw_message in chunk])
+
+            # Обработанные письма пачки отмечаются прочитанными сразу после пачки (в том числе при ошибке
+            # на одном из следующих писем пачки), а не в конце всего вызова
+            processed_uids = []
+            try:
+                for (msg_uid, _), message_result in zip(chunk, processed):
+                    email_data: Optional[EmailData] = message_result['email_data']
+                    if email_data is None:
+                        logger.print(f"Письмо UID {msg_uid.decode('utf-8')} не обработано:\n{message_result['error']}")
+                        continue
+
+                    result.append(email_data)
+
+                    # Запись csv: файлы письма (имена не пересекаются с другими письмами) и общий файл за день
+                    uid = msg_uid.decode('utf-8')
+                    if EXPORT_PER_MESSAGE:
+                        default_pipeline.export(email_data, 'csv', EXPORT_FOLDER, f'{batch_name}_uid{uid}')
+                    if combined:
+                        combined.write(f'uid{uid}', email_data.sender_address, email_data.date, email_data.rate_tables)
+
+                    processed_uids.append(msg_uid)
+
+                    # Отправка ответного письма
+                    if email_data.has_html:
+                        email_text = "\n+\n".join((format_csv_to_table(table.to_csv())
+                                                     for table in email_data.rate_tables))
+                        if sender:
+                            sender.send(email_text=email_text,
+                                        email_format='html',
+                                        recipient_email=email_data.sender_address,
+                                        subject=f'Автоответ от {email_user}',
+                                        )
+                        else:
+                            send_email(email_text=email_text,
+                                       email_format='html',
+                                       recipient_email=email_data.sender_address,
+                                       subject=f'Автоответ от {email_user}',
+                                       email_user=email_user,
+                                       email_pass=email_pass,
+                                       )
+            finally:
+                mark_seen(mail, processed_uids)
+
+    finally:
+        if combined:
+            combined.close()
+
+    return result
 
 
 def main(email_user: str, email_pass: str, imap_server: str, imap_port: int = 993) -> list[EmailData]:
-    """Проверяет и обрабатывает новые письма"""
+    """Однократно проверяет и обрабатывает новые письма (с подключением и отключением от сервера)"""
 
     result = []
 
     # Подключение к серверу
     mail: imaplib.IMAP4_SSL = connect_to_imap(email_user, email_pass, imap_server, imap_port)
     if not mail:
-        print('Нет соединения')
+        logger.print('Нет соединения')
         return result
 
     try:
         # Получение новых писем
-        message_ids: list[bytes] = get_unseen_messages(mail)
-        if not message_ids:
-            print("Новых писем нет")
+        message_uids: list[bytes] = get_unseen_uids(mail)
+        if not message_uids:
+            logger.print("Новых писем нет")
             return result
 
-        print(f"Найдено новых писем: {len(message_ids)}")
-
-        # Обработка каждого письма
-        for msg_id in message_ids:
-
-            email_data = EmailData()
-
-            # Получение письма без отметки как прочитанное
-            status, msg_data = mail.fetch(msg_id.decode('utf-8'), 'BODY.PEEK[]')
-            if status != 'OK':
-                continue
-
-            # Парсинг письма
-            email_message: Message = email.message_from_bytes(msg_data[0][1])
+        logger.print(f"Найдено новых писем: {len(message_uids)}")
 
-            # Извлечение основных данных
-            subject: str = decode_subject(email_message["Subject"])
-            sender: str = email_message.get("From", "Неизвестный отправитель")
-            date: str = email_message.get("Date", "Дата неизвестна")
-            email_data.subject = subject
-            email_data.sender = sender
-            email_data.date = date
-
-            # Извлечение текстовой части
-            text_content: Optional[str] = extract_text_content(email_message)
-            if text_content:
-                email_data.text = text_content
-
-            # Извлечение html части
-            html_content: Optional[str] = extract_html_content(email_message)
-            if html_content:
-                email_data.html = html_content
-
-                # Вычисление таблиц ставок
-                email_data.rate_tables_processor()
-
-            result.append(email_data)
-
-            # Запись csv
-            email_data.rate_tables_export(extension='csv', folder='CSVs')
-
-            # Отметить как прочитанное
-            mail.store(msg_id.decode('utf-8'), '+FLAGS', '\\Seen')
-
-            # Отправка ответного письма
-            if html_content:
-                email_text = "\n+\n".join(map(format_csv_to_table, email_data.rate_tables_csv))
-                send_email(email_text=email_text,
-                           email_format='html',
-                           recipient_email=email_data.sender_address,
-                           subject=f'Автоответ от {email_user}',
-                           email_user=email_user,
-                           email_pass=email_pass,
-                           )
-
-        return result
+        return process_messages(mail, message_uids, email_user, email_pass)
 
     except Exception:
-        print(traceback.format_exc())
+        logger.print(traceback.format_exc())
         return []
 
     finally:
-        print("Закрытие соединения...")
+        logger.print("Закрытие соединения...")
         mail.close()
         mail.logout()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # пул процессов в сборке PyInstaller
 
     IMAP_SERVER: str = "imap.gmail.com"
 
-    while True:
-        result = main(email_user=config.EMAIL_ADDRESS,
-                      email_pass=config.EMAIL_PASSWORD,
-                      imap_server=IMAP_SERVER)
-        print(result)
-        time.sleep(5)
+    # Журнал демона: файл с ротацией по размеру
+    logger.add_log_file(LOG_FILE)
+
+    # Разбор писем и вычисление таблиц ставок в пуле процессов
+    pool = MessagePool(workers=MESSAGE_POOL_WORKERS)
+
+    # Ответные письма отправляются в фоне через постоянное SMTP соединение
+    sender = SmtpSender(email_user=config.EMAIL_ADDRESS, email_pass=config.EMAIL_PASSWORD).start()
+
+    def handle_new_messages(mail: imaplib.IMAP4, message_uids: list[bytes]) -> None:
+        try:
+            result = process_messages(mail, message_uids, config.EMAIL_ADDRESS, config.EMAIL_PASSWORD,
+                                      sender=sender, pool=pool)
+            logger.print(f"Обработано писем: {len(result)} (всего {pool.counters['messages']}, "
+                         f"отсеяно быстрой проверкой {pool.counters['prefiltered']})")
+        except (imaplib.IMAP4.abort, OSError):
+            raise  # обрыв соединения - ImapWorker переподключится
+        except Exception:
+            logger.print(traceback.format_exc())
+
+    # Одна долгоживущая сессия: IDLE (или NOOP-опрос), переподключение с backoff
+    worker = ImapWorker(email_user=config.EMAIL_ADDRESS,
+                        email_pass=config.EMAIL_PASSWORD,
+                        imap_server=IMAP_SERVER,
+                        handler=handle_new_messages)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    finally:
+        logger.print("Отправка оставшихся писем...")
+        sender.close()
+        pool.close()
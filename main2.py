@@ -1,55 +1,35 @@
 import os
 import sys
+import base64
 import argparse
 import traceback
-import extract_msg
-from typing import Optional
+from typing import TYPE_CHECKING
 
-from src.models import EmailData
-from src.utils import decode_subject
 from src.logger import logger
+from src.daemon import DaemonServer, send_request
+from src.parameters import DAEMON_HOST, DAEMON_PORT
 
+if TYPE_CHECKING:
+    from src.models import EmailData
 
-def main(file_path: str) -> list[EmailData]:
+
+def main(file_path: str) -> list['EmailData']:
     """ Обрабатывает указанный .msg файл и сохраняет результат в .csv/.xml """
 
+    # клиенту демона библиотеки разбора писем не нужны; extract_msg импортируется при чтении файла
+    from src.sources import MsgFile
+    from src.pipeline import default_pipeline
+
     result = []
 
     try:
-        logger.print("Чтение .msg файла с помощью extract-msg")
-        msg = extract_msg.Message(file_path)
-        email_data = EmailData()
-
-        logger.print("Извлечение основных данных")
-        subject: str = decode_subject(msg.subject)
-        sender: str = msg.sender or "Неизвестный отправитель"
-        date: str = msg.date or "Дата неизвестна"
-        email_data.subject = subject
-        email_data.sender = sender
-        email_data.date = date
-
-        logger.print("Извлечение текстовой части")
-        text_content: Optional[str] = msg.body
-        if text_content:
-            email_data.text = text_content
-
-        logger.print("Извлечение html части")
-        html_content: Optional[str] = msg.htmlBody
-        if html_content:
-            email_data.html = html_content
-            logger.print("Вычисление таблиц ставок")
-            email_data.rate_tables_processor()
-
+        email_data = default_pipeline.process(MsgFile(file_path))
         result.append(email_data)
 
         logger.print("Запись csv / xml")
         folder = os.path.dirname(os.path.abspath(file_path))
         filename = os.path.splitext(os.path.basename(file_path))[0]
-        email_data.rate_tables_export(
-            extension='xml',
-            folder=folder,
-            filename=filename,
-        )
+        default_pipeline.export(email_data, 'xml', folder, filename)
 
         logger.print("Завершение работы программы.")
 
@@ -63,13 +43,69 @@ def main(file_path: str) -> list[EmailData]:
         return []
 
 
+def process_request(request: dict) -> dict:
+    """
+    Запрос к демону:
+    - {"path": путь к .msg} - то же, что main(path): .xml и .log рядом с файлом (только для существующего .msg);
+    - {"data": base64 письма, "format": "msg" | "eml"} - таблицы ставок в ответе, без записи файлов
+    """
+
+    from src.sources import data_source
+    from src.pipeline import default_pipeline
+
+    logger.clear()  # журнал (.log рядом с файлом) - только этого запроса
+    if 'path' in request:
+        path = request['path']
+        if not (path.lower().endswith('.msg') and os.path.isfile(path)):
+            raise ValueError(f'Ожидается путь к существующему .msg файлу: {path}')
+        result = main(path)
+        return {'result': repr(result), 'log': ''.join(logger.data)}
+
+    email_data = default_pipeline.process(data_source(base64.b64decode(request['data']), request.get('format', 'msg')))
+    return {'subject': email_data.subject, 'sender': email_data.sender, 'date': email_data.date,
+            'tables': [table.to_dict() for table in email_data.rate_tables], 'log': ''.join(logger.data)}
+
+
+def serve() -> None:
+    """Демон: библиотеки загружаются один раз, запросы клиентов (main2.py <файл>) обрабатываются без запуска процесса"""
+
+    import extract_msg  # noqa: F401 - загрузка до первого запроса
+    import src.sources  # noqa: F401
+    import src.pipeline  # noqa: F401
+
+    with DaemonServer({'process': process_request}) as server:
+        logger.print(f"Демон main2 ожидает запросы на {DAEMON_HOST}:{DAEMON_PORT}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.print("Остановка демона")
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Обработка .msg файла и сохранение результата в .csv")
-    parser.add_argument("msg_file_path", type=str, help="Путь к .msg файлу для обработки")
+    parser.add_argument("msg_file_path", type=str, nargs='?', help="Путь к .msg файлу для обработки")
+    parser.add_argument("--serve", action="store_true", help="Запустить демон, обрабатывающий файлы по запросам")
+    parser.add_argument("--local", action="store_true", help="Обработать файл в этом процессе, без демона")
     args = parser.parse_args()
+    if args.serve:
+        serve()
+        sys.exit(0)
+
     msg_file_path = args.msg_file_path
+    if msg_file_path is None:
+        parser.error("не указан путь к .msg файлу")
     if not os.path.exists(msg_file_path):
         print(f"Файл {msg_file_path} не существует")
         sys.exit(1)
-    result = main(msg_file_path)
-    print(result)
+    # Файл обрабатывает демон, если он запущен и принял запрос, иначе - этот процесс
+    # Файл обрабатывает демон, если он запущен, иначе - этот процесс
+    response = None if args.local else send_request({'command': 'process', 'path': os.path.abspath(msg_file_path)})
+    if response is None:
+        result = main(msg_file_path)
+        print(result)
+    elif 'error' in response:
+        print(response['error'])
+        sys.exit(1)
+    else:
+        print(response['log'], end='')
+        print(response['result'])
@@ -0,0 +1,149 @@
+import os
+import glob
+import json
+import zipfile
+from typing import Container, Iterable, Iterator, NamedTuple, Optional
+
+from src.sources import MessageSource, message_format, file_source, data_source, mbox_sources
+
+
+class Source(NamedTuple):
+    """Письмо пакетной обработки"""
+    message: MessageSource  # файл читает рабочий процесс, письмо из архива передается содержимым
+    size: int
+    output: str  # путь результата (с расширением письма: 'a.eml' и 'a.msg' не совпадают) относительно папки выгрузки
+
+    @property
+    def key(self) -> str:
+        """Идентификатор в манифесте: путь к файлу или '<архив>::<письмо в архиве>'"""
+        return self.message.key
+
+
+def _safe_output(name: str) -> Optional[str]:
+    """
+    Относительный путь результата из имени файла / письма в архиве (расширение сохраняется); None - если имя
+    абсолютное или содержит '..' (например, '../../escaped.eml' в zip) и результат оказался бы вне папки выгрузки
+    """
+    parts = name.replace('\\', '/').split('/')
+    if name.startswith(('/', '\\')) or ':' in parts[0] or '..' in parts:  # ':' - диск Windows ('C:\\...')
+        return None
+    return os.path.normpath(os.path.join(*[part for part in parts if part not in ('', '.')] or ['_']))
+
+
+def _file_source(path: str, root: str, prefix: str) -> Optional[Source]:
+    output = _safe_output(os.path.relpath(path, root))
+    if output is None:
+        print(f"Пропущен {path}: путь результата вне папки выгрузки")
+        return None
+    return Source(file_source(path), os.path.getsize(path), os.path.join(prefix, output))
+
+
+def _zip_sources(path: str, skip: Container[str], prefix: str) -> Iterator[Source]:
+    """.msg / .eml файлы из zip-архива; письма читаются по одному, по мере обработки"""
+    name = os.path.join(prefix, os.path.basename(path))
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            msg_format = message_format(info.filename)
+            if info.is_dir() or msg_format is None:
+                continue
+            key = f'{os.path.abspath(path)}::{info.filename}'
+            if key in skip:
+                continue
+            output = _safe_output(info.filename)
+            if output is None:
+                print(f"Пропущено письмо {info.filename!r} из {path}: путь вне папки выгрузки")
+                continue
+            yield Source(data_source(archive.read(info), msg_format, key), info.file_size, os.path.join(name, output))
+
+
+def _mbox_sources(path: str, skip: Container[str], prefix: str) -> Iterator[Source]:
+    """Письма mbox (формат eml), ключ - порядковый номер письма в файле"""
+    name = os.path.join(prefix, os.path.basename(path))
+    for i, message in mbox_sources(path, skip):
+        yield Source(message, message.size, os.path.join(name, f'{i:06d}'))
+
+
+def iter_sources(inputs: Iterable[str], skip: Container[str] = ()) -> Iterator[Source]:
+    """
+    Письма из папок (рекурсивно), шаблонов glob, zip и mbox архивов и отдельных .msg / .eml файлов,
+    кроме писем с ключами из skip (например, Manifest);
+    Структура папок сохраняется в выгрузке относительно папки / шаблона, письма архива - в папке с его именем;
+    при нескольких входах результаты каждого - в папке с его номером ('0', '1', ...), чтобы одинаковые
+    относительные пути разных входов не совпадали
+    """
+    inputs = list(inputs)
+    seen = set()  # файл, попавший в несколько входов (папка и шаблон внутри нее), обрабатывается один раз
+    for i, path in enumerate(inputs):
+        prefix = str(i) if len(inputs) > 1 else ''
+        if os.path.isdir(path):
+            files = [os.path.join(folder, file) for folder, _, folder_files in os.walk(path) for file in folder_files]
+            root = path
+        elif zipfile.is_zipfile(path):
+            yield from _zip_sources(path, skip, prefix)
+            continue
+        elif path.lower().endswith('.mbox') or os.path.basename(path) == 'mbox':
+            yield from _mbox_sources(path, skip, prefix)
+            continue
+        elif os.path.isfile(path):
+            files = [path]
+            root = os.path.dirname(path)
+        else:
+            files = [match for match in glob.glob(path, recursive=True) if os.path.isfile(match)]
+            root = os.path.commonpath([os.path.dirname(match) for match in files]) if files else ''
+
+        for file in sorted(files):
+            key = os.path.abspath(file)
+            if message_format(file) and key not in skip and key not in seen:
+                seen.add(key)
+                source = _file_source(file, root, prefix)
+                if source is not None:
+                    yield source
+
+
+class Manifest:
+    """
+    Манифест пакетной обработки (JSON Lines): строка на обработанное письмо - ключ, статус ('ok' | 'error'),
+    число таблиц и размер; при повторном запуске письма из манифеста пропускаются (с retry_errors -
+    только успешно обработанные), поэтому прерванная обработка продолжается с места остановки
+    """
+
+    def __init__(self, path: str, retry_errors: bool = False):
+        self.path = path
+        self.done: set[str] = set()
+        line = ''
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:  # строка, недописанная при аварийном завершении
+                        continue
+                    if record['status'] == 'ok' or not retry_errors:
+                        self.done.add(record['key'])
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() and not line.endswith('\n'):
+            self._file.write('\n')  # недописанная строка не склеивается со следующей записью
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def add(self, key: str, status: str, tables: int, size: int) -> None:
+        self._file.write(json.dumps({'key': key, 'status': status, 'tables': tables, 'size': size},
+                                    ensure_ascii=False) + '\n')
+        self.done.add(key)
+
+    def flush(self) -> None:
+        """Записи на диск (после каждой пачки писем)"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> 'Manifest':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import traceback
+from typing import Iterable, Optional
+
+from src import parameters
+from src.rates import RateTable
+from src.parameters import RESULT_CACHE_PATH, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, \
+    RESULT_CACHE_EVICT_FRACTION, RESULT_CACHE_CHECK_INTERVAL
+
+RESULT_CACHE_SCHEMA = 1  # увеличивается при изменении формата записей или алгоритма извлечения таблиц
+
+# Настройки src/parameters.py, от которых зависят извлеченные таблицы (пути, журнал, демон и т.п. - не зависят)
+EXTRACTION_SETTINGS = ('FIELDS_ALIAS', 'SERVICES_KEYWORDS', 'STOPWORDS', 'HTML_PARSER', 'REPLY_HEADER_DIALECTS',
+                       'REPLY_HEADER_OPTIONAL_DIALECTS', 'REPLY_HEADER_EXTRA_DIALECTS')
+
+
+def parameters_version() -> str:
+    """Версия записей кэша: хэш настроек извлечения таблиц (EXTRACTION_SETTINGS) и RESULT_CACHE_SCHEMA"""
+    settings = {name: getattr(parameters, name) for name in EXTRACTION_SETTINGS}
+    return hashlib.sha256(repr((RESULT_CACHE_SCHEMA, settings)).encode('utf-8')).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Постоянный кэш таблиц ставок (SQLite): ключ - хэш html (всего письма или последнего сообщения цепочки),
+    значение - таблицы ставок (RateTable), в том числе пустой список для писем без ставок;
+    - записи другой версии (изменились настройки извлечения в parameters.py) удаляются при открытии;
+    - при превышении max_entries или max_bytes вытесняются давно не использованные записи (LRU) - сразу
+      доля evict_fraction, чтобы следующее вытеснение понадобилось не раньше, чем через столько же новых записей;
+      размер кэша ведется в памяти и сверяется с файлом раз в check_interval записей;
+    Ошибки SQLite (блокировка, поврежденный файл) не прерывают обработку: кэш просто не используется
+    """
+
+    def __init__(self,
+                 path: str = RESULT_CACHE_PATH,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 evict_fraction: float = RESULT_CACHE_EVICT_FRACTION,
+                 check_interval: int = RESULT_CACHE_CHECK_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_fraction = evict_fraction
+        self.check_interval = check_interval
+        self.version = parameters_version()
+        self.hits = 0
+        self.misses = 0
+
+        self._connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')  # несколько процессов пула читают одновременно
+        self._connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                 'key TEXT PRIMARY KEY, version TEXT, tables TEXT, size INTEGER, used REAL)')
+        # (used, size) - размер кэша и порядок вытеснения читаются из индекса, без чтения самих таблиц
+        self._connection.execute('DROP INDEX IF EXISTS results_used')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS results_used_size ON results (used, size)')
+        self._connection.execute('DELETE FROM results WHERE version != ?', (self.version,))
+        self._puts = 0
+        self._entries, self._bytes = self._size()
+
+    @staticmethod
+    def key(html: str) -> str:
+        return hashlib.sha256(html.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    @staticmethod
+    def key_from_pieces(pieces: Iterable[str]) -> str:
+        """key(''.join(pieces)) без сборки строки"""
+        digest = hashlib.sha256()
+        for piece in pieces:
+            digest.update(piece.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[list[RateTable]]:
+        try:
+            row = self._connection.execute('SELECT tables FROM results WHERE key = ? AND version = ?',
+                                           (key, self.version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+            return [RateTable.from_dict(table) for table in json.loads(row[0])]
+        except sqlite3.Error:
+            print(traceback.format_exc())
+            return None
+
+    def put(self, key: str, tables: list[RateTable]) -> None:
+        data = json.dumps([table.to_dict() for table in tables], ensure_ascii=False)
+        try:
+            self._connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                     (key, self.version, data, len(data), time.time()))
+            self._puts += 1
+            self._entries += 1  # с запасом: замена записи тоже считается новой
+            self._bytes += len(data)
+            if self._puts % self.check_interval == 0:
+                self._entries, self._bytes = self._size()
+            if self._entries > self.max_entries or self._bytes > self.max_bytes:
+                self._evict()
+        except sqlite3.Error:
+            print(traceback.format_exc())
+
+    def _size(self) -> tuple[int, int]:
+        return self._connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+
+    def _evict(self) -> None:
+        """Вытеснение давно не использованных записей до (1 - evict_fraction) от ограничений"""
+        entries, size = self._size()
+        keep_entries = int(self.max_entries * (1 - self.evict_fraction))
+        keep_bytes = int(self.max_bytes * (1 - self.evict_fraction))
+        if entries > self.max_entries:
+            self._connection.execute('DELETE FROM results WHERE key IN '
+                                     '(SELECT key FROM results ORDER BY used LIMIT ?)', (entries - keep_entries,))
+        if size > self.max_bytes:
+            self._connection.execute('DELETE FROM results WHERE key IN (SELECT key FROM '
+                                     '(SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS total FROM results) '
+                                     'WHERE total > ?)', (keep_bytes,))
+        self._entries, self._bytes = self._size()
+
+    def clear(self) -> None:
+        self._connection.execute('DELETE FROM results')
+        self._entries, self._bytes = 0, 0
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_pid: Optional[int] = None
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Кэш текущего процесса (соединение SQLite не переживает fork) или None, если кэш отключен"""
+    global _result_cache, _result_cache_pid
+
+    if not RESULT_CACHE_PATH:
+        return None
+    if _result_cache_pid != os.getpid():
+        _result_cache_pid = os.getpid()
+        try:
+            _result_cache = ResultCache()
+        except sqlite3.Error:
+            print(traceback.format_exc())
+            _result_cache = None
+    return _result_cache
@@ -0,0 +1,122 @@
+import os
+import hmac
+import json
+import socket
+import secrets
+import traceback
+import socketserver
+from typing import Callable, Optional
+
+from src.parameters import (DAEMON_HOST, DAEMON_PORT, DAEMON_CONNECT_TIMEOUT, DAEMON_READ_TIMEOUT,
+                            DAEMON_ACCEPT_TIMEOUT, DAEMON_MAX_REQUEST_BYTES, DAEMON_TOKEN_FILE)
+
+# Протокол: одна строка JSON-запроса {"command": ..., "token": ..., ...} -> одна строка JSON-ответа;
+# сразу после чтения запроса демон отправляет пробел (подтверждение приема, JSON его пропускает);
+# ошибка обработчика возвращается как {"error": traceback}
+_ACCEPTED = b' '
+Handler = Callable[[dict], dict]
+
+
+def _write_token(path: str, token: str) -> None:
+    """Токен демона в файл, доступный только владельцу (в Windows - по правам домашней папки)"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+        file.write(token)
+    os.replace(temp_path, path)
+
+
+def _read_token(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    timeout = DAEMON_READ_TIMEOUT  # молчащее соединение не занимает однопоточный сервер дольше этого
+
+    def handle(self) -> None:
+        try:
+            line = self.rfile.readline(DAEMON_MAX_REQUEST_BYTES + 1)
+            if not line.endswith(b'\n') and len(line) <= DAEMON_MAX_REQUEST_BYTES:
+                return  # клиент закрыл соединение, не дописав запрос
+            self.wfile.write(_ACCEPTED)
+        except OSError:
+            return  # истек DAEMON_READ_TIMEOUT или клиент отключился
+        try:
+            if len(line) > DAEMON_MAX_REQUEST_BYTES:
+                raise ValueError(f'Запрос больше {DAEMON_MAX_REQUEST_BYTES} байт')
+            request = json.loads(line)
+            if not hmac.compare_digest(str(request.get('token', '')), self.server.token):
+                raise PermissionError('Неверный токен демона')
+            handler = self.server.handlers[request.get('command', '')]
+            response = handler(request)
+        except Exception:
+            response = {'error': traceback.format_exc()}
+        try:
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+        except OSError:
+            pass  # клиент не дождался ответа (истек его timeout) и обработал запрос сам
+
+
+class DaemonServer(socketserver.TCPServer):
+    """
+    Постоянно работающий процесс с уже загруженными библиотеками и настройками: принимает запросы по TCP
+    на localhost и выполняет их по одному (логи и буфер журнала письма общие для процесса);
+    запрос, не дочитанный за DAEMON_READ_TIMEOUT, отбрасывается, чтобы не задерживать остальных клиентов;
+    порт localhost открыт всем локальным процессам, поэтому при запуске создается случайный токен
+    (token_file, только для владельца), и запросы без него отклоняются;
+    handlers - {команда: функция(запрос) -> ответ}, команда "ping" - проверка связи
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, handlers: dict[str, Handler], host: str = DAEMON_HOST, port: int = DAEMON_PORT,
+                 token_file: str = DAEMON_TOKEN_FILE):
+        self.handlers = {'ping': lambda request: {'pong': True}, **handlers}
+        self.token = secrets.token_hex(32)
+        self.token_file = token_file
+        super().__init__((host, port), _RequestHandler)
+        _write_token(token_file, self.token)  # после bind: порт занят - токен другого демона не перезаписывается
+
+    def server_close(self) -> None:
+        super().server_close()
+        if _read_token(self.token_file) == self.token:
+            os.remove(self.token_file)
+
+
+def send_request(request: dict,
+                 host: str = DAEMON_HOST,
+                 port: int = DAEMON_PORT,
+                 timeout: Optional[float] = None,
+                 token_file: str = DAEMON_TOKEN_FILE,
+                 accept_timeout: float = DAEMON_ACCEPT_TIMEOUT) -> Optional[dict]:
+    """
+    Отправляет запрос демону и ждет ответа (timeout - ожидание ответа после подтверждения приема, None - без
+    ограничения); None - если демон недоступен: нет файла токена, соединение не установлено
+    за DAEMON_CONNECT_TIMEOUT, запрос не отправлен или не подтвержден за accept_timeout (демон занят другим
+    запросом или завис), соединение прервано до ответа
+    """
+    token = _read_token(token_file)
+    if not token:
+        return None
+    request = {**request, 'token': token}
+    try:
+        connection = socket.create_connection((host, port), timeout=DAEMON_CONNECT_TIMEOUT)
+    except OSError:
+        return None
+
+    with connection:
+        try:
+            connection.settimeout(accept_timeout)
+            connection.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+            if connection.recv(1) != _ACCEPTED:
+                return None
+            connection.settimeout(timeout)
+            with connection.makefile('rb') as response:
+                line = response.readline()
+        except OSError:
+            return None
+    return json.loads(line) if line.endswith(b'\n') else None
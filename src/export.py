@@ -0,0 +1,105 @@
+import os
+import csv
+import time
+from uuid import uuid4
+from typing import Callable, Literal, Optional, TextIO
+
+from src.rates import RATE_COLUMNS, RateTable
+
+EXPORT_BUFFER_SIZE = 256 * 1024
+
+
+def export_name(*parts: str) -> str:
+    """Имя файлов письма без коллизий: время, части (например, UID письма) и случайный суффикс"""
+    return '_'.join([time.strftime('%Y%m%d-%H%M%S'), *parts, uuid4().hex[:8]])
+
+
+def _temp_path(file_path: str) -> str:
+    """Временный файл рядом с file_path (os.replace работает только в пределах одного диска)"""
+    folder, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(folder, f'.{name}.{uuid4().hex[:8]}.tmp')
+
+
+def write_atomic(file_path: str, write: Callable[[TextIO], None]) -> None:
+    """
+    Пишет файл через временный файл в той же папке и переименование (os.replace):
+    читатель видит либо прежний файл, либо новый целиком, но не записанный наполовину
+    """
+    temp_path = _temp_path(file_path)
+    try:
+        with open(temp_path, 'x', encoding='utf-8', newline='', buffering=EXPORT_BUFFER_SIZE) as file:
+            write(file)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def export_rate_tables(rate_tables: list[RateTable],
+                       extension: Literal['csv', 'xml'],
+                       folder: str,
+                       filename: str) -> list[str]:
+    """Таблицы письма в файлы <filename>_<i>.<extension>; возвращает пути записанных файлов"""
+    os.makedirs(folder, exist_ok=True)
+    extension = extension.lower()
+    written = []
+    for i, table in enumerate(rate_tables):
+        file_path = os.path.join(folder, f'{filename}_{i}.{extension}')
+        write_atomic(file_path, table.write_csv if extension == 'csv' else table.write_xml)
+        written.append(file_path)
+    return written
+
+
+class CombinedCsvSink:
+    """
+    Один CSV на пачку писем вместо файла на каждую таблицу: строки всех таблиц с указанием письма
+    (источник, отправитель, дата, номер таблицы) и столбцами RATE_COLUMNS в едином порядке;
+    - append=False: пишется во временный файл, который при close() переименовывается в file_path
+      (пустая пачка файла не создает);
+    - append=True: строки дописываются в file_path (например, файл за день), заголовок - только в новый файл
+    """
+
+    COLUMNS = ('источник', 'отправитель', 'дата', 'таблица', *RATE_COLUMNS)
+
+    def __init__(self, file_path: str, append: bool = False):
+        self.file_path = file_path
+        self.append = append
+        self.rows = 0
+        self._temp_path: Optional[str] = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        if append:
+            self._file = open(file_path, 'a', encoding='utf-8', newline='', buffering=EXPORT_BUFFER_SIZE)
+        else:
+            self._temp_path = _temp_path(file_path)
+            self._file = open(self._temp_path, 'x', encoding='utf-8', newline='', buffering=EXPORT_BUFFER_SIZE)
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        if self._file.tell() == 0:
+            self._writer.writerow(self.COLUMNS)
+
+    def write(self, source: str, sender: Optional[str], date: Optional[str], rate_tables: list[RateTable]) -> None:
+        """Добавляет строки всех таблиц письма"""
+        for i, table in enumerate(rate_tables):
+            for row in table:  # порядок RATE_COLUMNS
+                self._writer.writerow([source, sender or '', date or '', i, row.service,
+                                       RateTable.format_value(row.rate), RateTable.format_value(row.entry)])
+                self.rows += 1
+        if self.append:
+            self._file.flush()  # файл дописывается по письму целиком, а не кусками буфера
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.close()
+        if self._temp_path is not None:
+            if self.rows:
+                os.replace(self._temp_path, self.file_path)
+            else:
+                os.remove(self._temp_path)
+
+    def __enter__(self) -> 'CombinedCsvSink':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
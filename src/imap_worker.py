@@ -0,0 +1,197 @@
+import ssl
+import time
+import select
+import imaplib
+import traceback
+from typing import Callable, List, Optional
+
+from src.logger import logger
+from src.utils import connect_to_imap, get_unseen_uids, get_uidvalidity
+from src.parameters import IMAP_RESCAN_INTERVAL
+
+
+class ImapWorker:
+    """
+    Долгоживущая IMAP-сессия вместо переподключения на каждый опрос:
+    - одно авторизованное соединение, новые письма ожидаются через IDLE (RFC 2177);
+    - если сервер не поддерживает IDLE - опрос командой NOOP раз в poll_interval секунд;
+    - при обрыве соединения переподключение с экспоненциальной задержкой (backoff);
+    - UID новых непрочитанных писем передаются в handler(mail, uids); запоминаются UIDVALIDITY и последний
+      переданный UID, поэтому каждый опрос запрашивает только письма, которые еще не передавались;
+    - письма, оставшиеся непрочитанными (ошибка обработки, пачка, не полученная UID FETCH), передаются повторно
+      полным поиском UNSEEN - в начале каждой сессии и раз в rescan_interval секунд
+
+    connect - фабрика соединения (по умолчанию connect_to_imap), ее можно подменить локальным IMAP-сервером
+    """
+
+    def __init__(self,
+                 email_user: str,
+                 email_pass: str,
+                 imap_server: str,
+                 handler: Callable[[imaplib.IMAP4, List[bytes]], None],
+                 imap_port: int = 993,
+                 connect: Callable[..., Optional[imaplib.IMAP4]] = connect_to_imap,
+                 idle_timeout: float = 29 * 60,
+                 poll_interval: float = 5,
+                 rescan_interval: float = IMAP_RESCAN_INTERVAL,
+                 min_backoff: float = 1,
+                 max_backoff: float = 300):
+        self.email_user = email_user
+        self.email_pass = email_pass
+        self.imap_server = imap_server
+        self.imap_port = imap_port
+        self.handler = handler
+        self.connect = connect
+        self.idle_timeout = idle_timeout  # RFC 2177: IDLE нужно перезапускать не реже, чем раз в 29 минут
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self.mail: Optional[imaplib.IMAP4] = None
+        self._running = False
+        self.uidvalidity: Optional[int] = None
+        self.last_uid = 0
+        self._next_rescan = 0.0
+
+    # ------------------------------------------------------------------------------------------------------ session
+
+    def _open(self) -> imaplib.IMAP4:
+        mail = self.connect(self.email_user, self.email_pass, self.imap_server, self.imap_port)
+        if not mail:
+            raise ConnectionError('Нет соединения')
+
+        # при смене UIDVALIDITY старые UID недействительны - начинаем заново
+        uidvalidity = get_uidvalidity(mail)
+        if uidvalidity is None or uidvalidity != self.uidvalidity:
+            self.uidvalidity = uidvalidity
+            self.last_uid = 0
+        self._next_rescan = 0.0  # письма, не обработанные до обрыва соединения
+        return mail
+
+    def _close(self) -> None:
+        if self.mail is None:
+            return
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self.mail = None
+
+    def supports_idle(self) -> bool:
+        return self.mail is not None and 'IDLE' in self.mail.capabilities
+
+    # --------------------------------------------------------------------------------------------------------- wait
+
+    def _buffered(self) -> bool:
+        """
+        Есть ли уже прочитанные из сокета данные: в буфере imaplib (mail.file) - например, уведомление,
+        пришедшее в одном пакете с ответом '+' на IDLE, - или расшифрованные SSL-данные
+        """
+        sock = self.mail.sock
+        if isinstance(sock, ssl.SSLSocket) and sock.pending():
+            return True
+        timeout = sock.gettimeout()
+        sock.settimeout(0)  # peek с пустым буфером читает из сокета - без ожидания
+        try:
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def _wait_readable(self, timeout: float) -> bool:
+        """Ждет данные от сервера не дольше timeout секунд (с учетом уже прочитанных в буфер)"""
+        if self._buffered():
+            return True
+        readable, _, _ = select.select([self.mail.sock], [], [], timeout)
+        return bool(readable)
+
+    def idle(self, timeout: float) -> bool:
+        """
+        Одна команда IDLE: ждет уведомления сервера (EXISTS/RECENT/...) не дольше timeout секунд;
+        Возвращает True, если сервер что-то сообщил
+        """
+        mail = self.mail
+        tag = mail._new_tag()
+        mail.send(tag + b' IDLE\r\n')
+        response = mail.readline()
+        if not response.startswith(b'+'):
+            raise imaplib.IMAP4.error(f'IDLE отклонен сервером: {response!r}')
+
+        notified = False
+        deadline = time.monotonic() + timeout
+        while self._running and not notified:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._wait_readable(min(remaining, 1.0)):
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort('Соединение закрыто сервером')
+                notified = line.startswith(b'*') and not line.upper().startswith(b'* OK')
+
+        mail.send(b'DONE\r\n')
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort('Соединение закрыто сервером')
+            if line.startswith(tag):
+                break
+        return notified
+
+    def poll(self, timeout: float) -> None:
+        """Запасной вариант без IDLE: пауза и NOOP (сервер присылает изменения в ответ на любую команду)"""
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            time.sleep(min(0.5, max(deadline - time.monotonic(), 0)))
+        self.mail.noop()
+
+    # ------------------------------------------------------------------------------------------------------ process
+
+    def dispatch(self) -> None:
+        """
+        Передает в handler UID непрочитанных писем, пришедших после последнего переданного;
+        раз в rescan_interval - всех непрочитанных (handler отмечает прочитанными только обработанные письма)
+        """
+        rescan = time.monotonic() >= self._next_rescan
+        uids = get_unseen_uids(self.mail, after_uid=0 if rescan else self.last_uid)
+        if rescan:
+            self._next_rescan = time.monotonic() + self.rescan_interval
+        if uids:
+            logger.print(f"Найдено новых писем: {len(uids)}")
+            self.handler(self.mail, uids)
+            self.last_uid = max(self.last_uid, max(int(uid) for uid in uids))
+
+    def run_session(self) -> None:
+        """Работа в рамках одного соединения, до ошибки или остановки"""
+        self.dispatch()  # письма, пришедшие, пока соединения не было
+        while self._running:
+            if self.supports_idle():
+                self.idle(min(self.idle_timeout, max(self._next_rescan - time.monotonic(), 1)))
+            else:
+                self.poll(self.poll_interval)
+            if self._running:
+                self.dispatch()
+
+    def run(self) -> None:
+        """Основной цикл: подключение, ожидание новых писем, переподключение с backoff при ошибках"""
+        self._running = True
+        backoff = self.min_backoff
+        while self._running:
+            try:
+                self.mail = self._open()
+                backoff = self.min_backoff
+                self.run_session()
+            except Exception:
+                logger.print(traceback.format_exc())
+                if self._running:
+                    logger.print(f"Переподключение через {backoff:.0f} с")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+            finally:
+                self._close()
+
+    def stop(self) -> None:
+        """Останавливает цикл (можно вызывать из другого потока); текущий IDLE завершится в течение секунды"""
+        self._running = False
@@ -1,9 +1,91 @@
 import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from src.parameters import LOG_BUFFER_SIZE, LOG_QUEUE_SIZE, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Не блокирует вызывающий поток: при заполненной очереди запись отбрасывается (и считается)"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # очередь может быть заполнена - ждем место
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Вывод в текущий sys.stdout (его может не быть в оконной сборке PyInstaller)"""
+
+    terminator = ''
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if sys.stdout is None or not getattr(record, 'console', True):
+            return
+        self.setStream(sys.stdout)
+        super().emit(record)
 
 
 class Logger:
-    def __init__(self):
-        self.data = []
+    """
+    Журнал обработки писем:
+    - print() выводит сообщение в консоль и в файл журнала (add_log_file) из фонового потока:
+      вызывающий поток только ставит запись в ограниченную очередь и не ждет вывода;
+    - data - последние buffer_size сообщений (журнал текущего письма, который save() пишет рядом с .msg);
+      clear() очищает его перед следующим письмом, старые сообщения вытесняются и без clear()
+    """
+
+    def __init__(self, buffer_size: int = LOG_BUFFER_SIZE, queue_size: int = LOG_QUEUE_SIZE):
+        self.data = deque(maxlen=buffer_size)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._handler = _DroppingQueueHandler(self._queue)
+        self._console = _ConsoleHandler()
+        self._file_handlers: list[logging.Handler] = []
+        self._file_handlers_pid: Optional[int] = None  # файл журнала пишет только процесс, который его открыл
+        self._listener: Optional[_Listener] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @property
+    def dropped(self) -> int:
+        """Сколько сообщений не попало в консоль / файл из-за переполнения очереди"""
+        return self._handler.dropped
+
+    def _emit(self, message: str, console: bool = True) -> None:
+        if self._pid != os.getpid():  # первый вызов или процесс-потомок (fork): свой фоновый поток
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                    self._handler.queue = self._queue
+                    self._listener = _Listener(self._queue, *self._handlers())
+                    self._listener.start()
+                    self._pid = os.getpid()
+        record = logging.LogRecord('rates_mail_service', logging.INFO, '', 0, message, None, None)
+        record.console = console
+        self._handler.handle(record)
+
+    def _handlers(self) -> tuple:
+        if self._file_handlers_pid == os.getpid():
+            return self._console, *self._file_handlers
+        return self._console,
 
     def print(self, *args, **kwargs):
         # Извлекаем параметры sep и end из kwargs, если они есть, или задаем значения по умолчанию
@@ -11,13 +93,16 @@ class Logger:
         end = kwargs.pop('end', '\n')
         # Формируем сообщение
         message = sep.join(map(str, args)) + end
-        # Выводим сообщение в консоль
-        print(message, **kwargs, end='')
+        # Выводим сообщение в консоль и файл журнала (в фоновом потоке)
+        self._emit(message)
         # Сохраняем сообщение в data
         self.data.append(message)
 
     def write(self, string_):
-        self.data.append(string_ + '\n')
+        """Сообщение без вывода в консоль (только в data и файл журнала)"""
+        message = string_ + '\n'
+        self._emit(message, console=False)
+        self.data.append(message)
 
     def save(self, log_folder, logfile_name):
         # Записываем логи в файл
@@ -26,7 +111,26 @@ class Logger:
             file.writelines(self.data)
 
     def clear(self):
-        self.data = []
+        self.data.clear()
+
+    def add_log_file(self, path: str, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT) -> None:
+        """Общий файл журнала с ротацией по размеру (path, path.1, ... path.<backup_count>)"""
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.terminator = ''
+        handler.setFormatter(logging.Formatter('%(asctime)s [%(process)d] %(message)s'))
+        with self._lock:
+            self._file_handlers.append(handler)
+            self._file_handlers_pid = os.getpid()
+            if self._listener is not None:
+                self._listener.handlers = self._handlers()
+
+    def flush(self) -> None:
+        """Дожидается вывода всех сообщений из очереди (фоновый поток будет запущен заново при следующем print)"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
 
 
 logger = Logger()
@@ -0,0 +1,86 @@
+from collections import deque
+from typing import Optional
+
+
+class KeywordMatcher:
+    """
+    Многошаблонный поиск ключевых слов (автомат Ахо-Корасик), строится один раз по словарю {ключевое слово: значение};
+    Текст просматривается за один проход независимо от числа ключевых слов;
+    Побеждает ключевое слово, стоящее в словаре раньше (а не раньше в тексте), как в прежнем поиске по словарю;
+    Для небольших словарей (до linear_scan_limit слов, в том числе SERVICES_KEYWORDS) поиск `in` по каждому
+    ключевому слову быстрее автомата на Python, поэтому используется он; порог - по benchmarks/services_matcher.py
+    """
+
+    def __init__(self, keyword_dict: dict, linear_scan_limit: int = 96):
+        self.values = list(keyword_dict.values())
+        self._key_words = [key_word.lower() for key_word in keyword_dict]
+        self._linear = len(self._key_words) <= linear_scan_limit
+        self._pairs = list(zip(self._key_words, self.values))
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[Optional[int]] = [None]  # наименьший приоритет ключевого слова, оканчивающегося в узле
+
+        for priority, key_word in enumerate(keyword_dict):
+            node = 0
+            for char in key_word.lower():
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            if self._best[node] is None:
+                self._best[node] = priority
+
+        # суффиксные ссылки (обход в ширину); в _best учитываются и ключевые слова, оканчивающиеся по ссылке
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._best[child] = self._min(self._best[child], self._best[self._fail[child]])
+
+    @staticmethod
+    def _min(a: Optional[int], b: Optional[int]) -> Optional[int]:
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
+
+    def match(self, text: str) -> Optional[int]:
+        """Приоритет (индекс в словаре) первого по порядку словаря ключевого слова, найденного в тексте"""
+        if self._linear:
+            text = text.lower()
+            for priority, key_word in enumerate(self._key_words):
+                if key_word in text:
+                    return priority
+            return None
+
+        goto, fail, best_out = self._goto, self._fail, self._best
+        best = None
+        node = 0
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            found = best_out[node]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+    def classify(self, text: str, default: str = '') -> str:
+        if self._linear:  # без вызова match и поиска значения по приоритету
+            text = text.lower()
+            for key_word, value in self._pairs:
+                if key_word in text:
+                    return value
+            return default
+        priority = self.match(text)
+        return default if priority is None else self.values[priority]
@@ -1,96 +1,174 @@
-import os
-import pandas as pd
-from bs4 import BeautifulSoup
-from typing import Literal
+import email
+from typing import Literal, Optional
+from email.message import Message
 from email.utils import parseaddr
 
 from src.logger import logger
-from src.utils import (find_tables_positions, replace_tables_with_uuid, replace_uuid_with_tables,
-                       split_html, extract_outer_html_tables, dataframe_is_table_rates, postprocess_df)
+from src.parameters import EMAIL_DATA_DEBUG
+from src.rates import RateTable
+from src.export import export_rate_tables
+from src.spans import HtmlSpans
+from src.pipeline import Pipeline, default_pipeline
+from src.utils import decode_subject, decode_html_body, extract_text_content, extract_html_content
 
 
 class EmailData:
-    def __init__(self):
+    """
+    Данные письма и извлеченные из него таблицы ставок;
+    По умолчанию промежуточные результаты разбора (html, tables_info, replacement, restored, parts) не хранятся:
+    после rate_tables_processor() остаются только метаданные, text и rate_tables;
+    debug=True (или EMAIL_DATA_DEBUG) - промежуточные результаты сохраняются для отладки
+    """
+
+    __slots__ = ('text', '_html', 'has_html', '_soup', 'subject', '_sender', 'sender_address', 'date', 'debug',
+                 'tables_info', '_spans', 'rate_tables', 'prefiltered')
+
+    def __init__(self, debug: bool = EMAIL_DATA_DEBUG):
         self.text = None
+        self.has_html = False  # остается True и после освобождения html
         self.html = None
         self._soup = None
         self.subject = None
         self._sender = None
         self.sender_address = None
         self.date = None
+        self.debug = debug
 
         self.tables_info = []
-        self.replacement = ""
-        self.restored = ""
-        self.parts = []
-        self.raw_rate_tables = []
-        self.rate_tables = []
-        self.rate_tables_csv = []
-        self.rate_tables_xml = []
-
-    def rate_tables_processor(self) -> None:
-        """ Вычисление таблиц ставок """
-
-        self._soup = BeautifulSoup(self.html, 'html.parser')
-        tables_info = find_tables_positions(self._soup)
-        tables_info, replacement = replace_tables_with_uuid(self._soup, tables_info)
-
-        self.tables_info = tables_info
-        self.replacement = replacement
-        self.restored = replace_uuid_with_tables(self.replacement, self.tables_info)
-
-        self.parts = split_html(self.replacement)
-        if self.parts:
-            last_message_with_ids = self.parts[0]
-            last_message: str = replace_uuid_with_tables(last_message_with_ids, self.tables_info)
-            last_message_outer_tables: list[pd.DataFrame] = extract_outer_html_tables(last_message)
-            self.raw_rate_tables = [df for df in last_message_outer_tables if dataframe_is_table_rates(df)]
-            self.rate_tables = [postprocess_df(df) for df in self.raw_rate_tables]
-
-            # если хотя бы одну таблицу не удалось обработать, пропускается все письмо
-            if any([x is None for x in self.rate_tables]):
-                logger.print('ОШИБКА! Одну из таблиц ставок не удалось обработать. Письмо не будет обработано.')
-                self.rate_tables = []
-            else:
-                logger.print(f"Успешно обработано <{len(self.rate_tables)}> таблиц ставок.")
-
-    def rate_tables_export(self, extension: Literal['csv', 'xml'], folder, filename='result'):
-        if not hasattr(self, 'rate_tables_csv'):
-            logger.print('Rate tables processing has not been performed yet.')
-            return 0
-        elif not self.rate_tables:
+        self._spans: Optional[HtmlSpans] = None  # последнее письмо (только в режиме debug)
+        self.rate_tables: list[RateTable] = []
+        self.prefiltered = False  # таблицы ставок не искались: быстрая проверка показала, что их нет
+
+    def __repr__(self) -> str:
+        return f'EmailData(subject={self.subject!r}, sender={self.sender_address!r}, rate_tables={self.rate_tables})'
+
+    @classmethod
+    def from_email_message(cls, email_message: Message) -> 'EmailData':
+        """Заполняет EmailData из письма email.message.Message (IMAP)"""
+
+        email_data = cls()
+
+        # Извлечение основных данных
+        email_data.subject = decode_subject(email_message["Subject"])
+        email_data.sender = email_message.get("From", "Неизвестный отправитель")
+        email_data.date = email_message.get("Date", "Дата неизвестна")
+
+        # Извлечение текстовой части
+        text_content: Optional[str] = extract_text_content(email_message)
+        if text_content:
+            email_data.text = text_content
+
+        # Извлечение html части
+        html_content: Optional[str] = extract_html_content(email_message)
+        if html_content:
+            email_data.html = html_content
+
+        return email_data
+
+    @classmethod
+    def from_bytes(cls, raw_message: bytes) -> 'EmailData':
+        """Заполняет EmailData из байтов письма (RFC 822, например, результат IMAP FETCH)"""
+        return cls.from_email_message(email.message_from_bytes(raw_message))
+
+    @classmethod
+    def from_msg_file(cls, file_path: str | bytes) -> 'EmailData':
+        """Заполняет EmailData из .msg файла Outlook (путь или содержимое файла); файл закрывается сразу после чтения"""
+
+        import extract_msg
+
+        logger.print("Чтение .msg файла с помощью extract-msg")
+        msg = extract_msg.Message(file_path)
+        try:
+            email_data = cls()
+
+            logger.print("Извлечение основных данных")
+            email_data.subject = decode_subject(msg.subject)
+            email_data.sender = msg.sender or "Неизвестный отправитель"
+            email_data.date = msg.date or "Дата неизвестна"
+
+            logger.print("Извлечение текстовой части")
+            text_content: Optional[str] = msg.body
+            if text_content:
+                email_data.text = text_content
+
+            logger.print("Извлечение html части")
+            # htmlBody - байты; если html части нет или она пустая, используется текст письма
+            html_content: Optional[str] = decode_html_body(msg.htmlBody, email_data.sender_address) or text_content
+            if html_content:
+                email_data.html = html_content
+
+            return email_data
+
+        finally:
+            msg.close()
+
+    def rate_tables_processor(self, pipeline: Optional[Pipeline] = None) -> None:
+        """
+        Вычисление таблиц ставок (стадии split -> detect -> normalize конвейера src.pipeline);
+        html письма разбирается один раз, у таблиц, не похожих на таблицы ставок, читается только заголовок;
+        tables_info, replacement и restored относятся только к последнему письму цепочки (в режиме debug);
+        Таблицы ставок - RateTable (без pandas), DataFrame при необходимости - через RateTable.to_dataframe()
+        """
+        (pipeline or default_pipeline).extract(self)
+
+    def keep_parse_results(self, soup, spans: HtmlSpans) -> None:
+        """Промежуточные результаты разбора для отладки (режим debug)"""
+        self._soup = soup
+        self.tables_info = spans.tables
+        self._spans = spans
+
+    def release_parse_tree(self) -> None:
+        """Освобождает дерево разбора html (soup и узлы таблиц): после вычисления таблиц ставок оно не нужно"""
+        self._soup = None
+        for table in self.tables_info:
+            table.pop('node', None)
+
+    def rate_tables_export(self, extension: Literal['csv', 'xml'], folder, filename='result') -> list[str]:
+        """
+        Записывает таблицы ставок в <folder>/<filename>_<i>.<extension> (атомарно, через временный файл);
+        Чтобы письма не перезаписывали файлы друг друга в общей папке, filename - например, export_name(uid)
+        """
+        if not self.rate_tables:
             logger.print('No rate tables were extracted.')
-            return 0
-        else:
-            os.makedirs(folder, exist_ok=True)
-
-            if extension.lower() == 'csv':
-                self.rate_tables_csv = [df.to_csv(index=False) for df in self.rate_tables]
-                if not self.rate_tables_csv:
-                    logger.print('No rate tables were extracted to CSV.')
-                    return 0
-                for i, data in enumerate(self.rate_tables_csv):
-                    file_path = os.path.join(folder, f'{filename}_{i}.csv')
-                    try:
-                        with open(file_path, 'w', encoding="utf-8") as f:
-                            f.write(data)
-                        logger.print(f"Таблица {i} записана в {file_path}")
-                    except IOError as e:
-                        logger.print(f'Error writing file {file_path}: {e}')
-
-            elif extension.lower() == 'xml':
-                self.rate_tables_xml = [df.to_xml(encoding='utf-8', index=False) for df in self.rate_tables]
-                if not self.rate_tables_xml:
-                    logger.print('No rate tables were extracted to XML.')
-                    return 0
-                for i, data in enumerate(self.rate_tables_xml):
-                    file_path = os.path.join(folder, f'{filename}_{i}.xml')
-                    try:
-                        with open(file_path, 'w', encoding="utf-8") as f:
-                            f.write(data)
-                        logger.print(f"Таблица {i} записана в {file_path}")
-                    except IOError as e:
-                        logger.print(f'Error writing file {file_path}: {e}')
+            return []
+        if extension.lower() not in ('csv', 'xml'):
+            return []
+
+        try:
+            written = export_rate_tables(self.rate_tables, extension, folder, filename)
+        except OSError as e:
+            logger.print(f'Error writing rate tables to {folder}: {e}')
+            return []
+        for i, file_path in enumerate(written):
+            logger.print(f"Таблица {i} записана в {file_path}")
+        return written
+
+    @property
+    def replacement(self) -> str:
+        """Последнее письмо с UUID вместо таблиц (в режиме debug)"""
+        return self._spans.replacement() if self._spans else ""
+
+    @property
+    def restored(self) -> str:
+        """Последнее письмо с таблицами (в режиме debug), собирается при обращении"""
+        return self._spans.restored() if self._spans else ""
+
+    @property
+    def parts(self) -> list[str]:
+        return [self.replacement] if self._spans else []
+
+    @property
+    def html(self) -> Optional[str]:
+        return self._html
+
+    @html.setter
+    def html(self, value: Optional[str]):
+        if value is not None and not isinstance(value, str):
+            # байты должен декодировать источник (см. decode_html_body): дальше html - только str
+            raise TypeError(f'EmailData.html: ожидается str, получено {type(value).__name__}')
+        self._html = value
+        if value:
+            self.has_html = True
 
     @property
     def sender(self):
@@ -1,3 +1,12 @@
+import os
+import sys
+
+# Папка программы: папка exe в сборке PyInstaller, иначе - корень проекта (файлы программы не зависят от текущей папки)
+if getattr(sys, 'frozen', False):
+    PROGRAM_DIR = os.path.dirname(sys.executable)
+else:
+    PROGRAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 FIELDS_ALIAS = {
     'наименование': ['наименование', 'наименование услуги'],
     'ставка': ['ставка'],
@@ -47,3 +56,86 @@ SERVICES_KEYWORDS = {}
 for name1C, key_words_list in _SERVICES_KEYWORDS.items():
     for key_word in key_words_list:
         SERVICES_KEYWORDS[key_word.lower()] = name1C
+
+# Парсер BeautifulSoup для html писем ('lxml' быстрее; при его отсутствии используется 'html.parser')
+HTML_PARSER = 'lxml'
+
+# Заголовки цитируемого ответа, по которым от письма отделяется последнее сообщение.
+# Диалект - последовательность строк: (маркеры, обязательность). Строка подходит, если содержит
+# все маркеры в указанном порядке (без учета регистра); необязательная строка может отсутствовать.
+REPLY_HEADER_DIALECTS = {
+    # Outlook: Sent / To / [Cc] / Subject
+    'outlook_en': [(('sent:',), True), (('to:',), True), (('cc:',), False), (('subject:',), True)],
+    'outlook_ru': [(('отправлено:',), True), (('кому:',), True), (('копия:',), False), (('тема:',), True)],
+}
+
+# Дополнительные диалекты, включаются по имени в REPLY_HEADER_EXTRA_DIALECTS (например, ('gmail_en',));
+# на реальных письмах не проверены: строка "On ... wrote:" или "From:" в тексте письма обрежет его
+REPLY_HEADER_OPTIONAL_DIALECTS = {
+    # Outlook for Mac: From / Date / To / [Cc] / Subject
+    'outlook_mac_en': [(('from:',), True), (('date:',), True), (('to:',), True), (('cc:',), False),
+                       (('subject:',), True)],
+    # Gmail, Apple Mail: "On <дата>, <отправитель> wrote:"
+    'gmail_en': [(('on ', 'wrote:'), True)],
+    # Apple Mail: "<дата>, <отправитель> написал(а):"
+    'apple_mail_ru': [(('написал(а):',), True)],
+    'apple_mail_forward': [(('begin forwarded message:',), True)],
+}
+REPLY_HEADER_EXTRA_DIALECTS = ()
+
+# Количество писем, получаемых одной командой UID FETCH
+IMAP_FETCH_CHUNK_SIZE = 50
+
+# Период (с) полного поиска непрочитанных писем: письма, пропущенные при ошибке обработки или получения
+# (UID меньше последнего переданного), передаются повторно
+IMAP_RESCAN_INTERVAL = 5 * 60
+
+# Число процессов для разбора писем (0 - в текущем процессе, None - по числу процессоров)
+MESSAGE_POOL_WORKERS = None
+
+# Определение кодировки: размер фрагмента для chardet и число запоминаемых пар (отправитель, кодировка)
+ENCODING_SAMPLE_SIZE = 64 * 1024
+ENCODING_CACHE_SIZE = 1024
+
+# EmailData: хранить промежуточные результаты разбора html (html, soup, tables_info, replacement, restored, parts)
+EMAIL_DATA_DEBUG = False
+
+# Журнал: сообщений в буфере письма (logger.data), размер очереди вывода, файл журнала main.py (в папке программы)
+# и его ротация
+LOG_BUFFER_SIZE = 10_000
+LOG_QUEUE_SIZE = 10_000
+LOG_FILE = os.path.join(PROGRAM_DIR, 'rates_mail_service.log')
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Кэш результатов (таблиц ставок) по хэшу html: файл SQLite в папке программы (None - без кэша),
+# ограничения по числу записей и размеру; при превышении вытесняется сразу доля записей (RESULT_CACHE_EVICT_FRACTION),
+# размер кэша пересчитывается раз в RESULT_CACHE_CHECK_INTERVAL записей (кэш пополняют и другие процессы)
+RESULT_CACHE_PATH = os.path.join(PROGRAM_DIR, 'rates_cache.sqlite3')
+RESULT_CACHE_MAX_ENTRIES = 10_000
+RESULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+RESULT_CACHE_EVICT_FRACTION = 0.1
+RESULT_CACHE_CHECK_INTERVAL = 100
+
+# Выгрузка main.py: папка, общий CSV (для загрузки в 1С) - один файл за день (имя - шаблон time.strftime),
+# который дописывается при каждой проверке почты, и отдельные файлы таблиц каждого письма (по умолчанию -
+# только без общего CSV)
+EXPORT_FOLDER = 'CSVs'
+EXPORT_COMBINED_CSV = True
+EXPORT_COMBINED_CSV_NAME = 'rates_%Y%m%d.csv'
+EXPORT_PER_MESSAGE = not EXPORT_COMBINED_CSV
+
+# Демон main2.py --serve: адрес (только localhost), ожидание соединения клиентом (с), ожидание демоном запроса
+# от клиента (с), ожидание клиентом отправки запроса и подтверждения приема (с; иначе файл обрабатывается без демона)
+# и ограничение размера запроса; файл токена в домашней папке пользователя (права 0600): запросы принимаются
+# только от процессов этого пользователя
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8765
+DAEMON_CONNECT_TIMEOUT = 0.2
+DAEMON_READ_TIMEOUT = 5
+DAEMON_ACCEPT_TIMEOUT = 5
+DAEMON_MAX_REQUEST_BYTES = 64 * 1024 * 1024
+DAEMON_TOKEN_FILE = os.path.join(os.path.expanduser('~'), '.rates_mail_service_daemon')
+
+# Пакетная обработка (batch.py): писем в одной пачке пула (после каждой пачки манифест записывается на диск)
+BATCH_CHUNK_SIZE = 200
@@ -0,0 +1,164 @@
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Callable, Literal, Optional
+
+from bs4 import BeautifulSoup
+
+from src.logger import logger
+from src.rates import RateTable
+from src.spans import HtmlSpans
+from src.cache import get_result_cache
+from src.utils import (make_soup, find_last_message_prefix, extract_last_message_spans, read_rate_table_rows,
+                       rows_to_rate_table, may_contain_rate_table)
+
+if TYPE_CHECKING:
+    from src.models import EmailData
+    from src.sources import MessageSource
+
+
+# ------------------------------------------------------------------------------------------------------------ стадии
+
+def split_last_message(html: str) -> tuple[BeautifulSoup, HtmlSpans]:
+    """
+    split: заголовок ответа сначала ищется в исходном html, и разбирается только начало html до него (с запасом);
+    если в разобранном начале заголовок не подтвердился (или его нет), разбирается весь html
+    """
+    prefix_end = find_last_message_prefix(html)
+    if prefix_end is not None and prefix_end < len(html):
+        soup = make_soup(html[:prefix_end])
+        spans = extract_last_message_spans(soup, partial=True)
+        if spans is not None:
+            return soup, spans
+    soup = make_soup(html)
+    return soup, extract_last_message_spans(soup)
+
+
+def detect_rate_tables(spans: HtmlSpans) -> list[list[list[str]]]:
+    """detect: строки таблиц ставок последнего письма; у служебных таблиц (подписи, верстка) - только заголовок"""
+    return [rows for rows in (read_rate_table_rows(table['node']) for table in spans.tables) if rows is not None]
+
+
+def normalize_rate_tables(tables_rows: list[list[list[str]]]) -> Optional[list[RateTable]]:
+    """normalize: строки -> RateTable (услуги 1С, числа); None - если хотя бы одну таблицу не удалось обработать"""
+    rate_tables = [rows_to_rate_table(rows) for rows in tables_rows]
+    return None if any(table is None for table in rate_tables) else rate_tables
+
+
+def export_email_data(email_data: 'EmailData', extension: Literal['csv', 'xml'],
+                      folder: str, filename: str) -> list[str]:
+    """export: таблицы письма в <folder>/<filename>_<i>.<extension> с записью в журнал письма"""
+    return email_data.rate_tables_export(extension=extension, folder=folder, filename=filename)
+
+
+# ---------------------------------------------------------------------------------------------------------- конвейер
+
+class Pipeline:
+    """
+    Обработка письма из любого источника (src.sources): decode -> split -> detect -> normalize -> export;
+    - decode - load() источника (IMAP, .eml, .msg, mbox), остальные стадии - функции, которые можно заменить
+      в конструкторе (например, для сравнения реализаций);
+    - до split письма без таблицы с заголовками ставок отсеиваются быстрой проверкой, а повторно присланные
+      берутся из кэша результатов (src.cache) по хэшу html и хэшу последнего сообщения (кроме режима debug);
+      ключ кэша не различает реализации стадий, поэтому с замененными split / detect / normalize кэш не используется;
+    - timings / calls - суммарное время (с) и число вызовов по стадиям в этом процессе (для бенчмарков)
+    """
+
+    def __init__(self,
+                 split: Callable[[str], tuple[BeautifulSoup, HtmlSpans]] = split_last_message,
+                 detect: Callable[[HtmlSpans], list] = detect_rate_tables,
+                 normalize: Callable[[list], Optional[list[RateTable]]] = normalize_rate_tables,
+                 export: Callable[..., list[str]] = export_email_data,
+                 use_cache: bool = True):
+        self.split_stage = split
+        self.detect_stage = detect
+        self.normalize_stage = normalize
+        self.export_stage = export
+        self.use_cache = use_cache and (split, detect, normalize) == (split_last_message, detect_rate_tables,
+                                                                      normalize_rate_tables)
+        self.timings = Counter()
+        self.calls = Counter()
+
+    def _timed(self, stage: str, func: Callable, *args):
+        t0 = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[stage] += time.perf_counter() - t0
+            self.calls[stage] += 1
+
+    def decode(self, source: 'MessageSource') -> 'EmailData':
+        return self._timed('decode', source.load)
+
+    def extract(self, email_data: 'EmailData') -> None:
+        """Таблицы ставок письма (split -> detect -> normalize) в email_data.rate_tables"""
+
+        # Письма без таблицы с заголовками ставок отсеиваются без разбора html
+        if not self._timed('prefilter', may_contain_rate_table, email_data.html):
+            email_data.prefiltered = True
+            if not email_data.debug:
+                email_data.html = None
+            logger.print("Таблиц ставок нет (быстрая проверка), разбор html пропущен.")
+            return
+
+        # Повторно присланное письмо (тот же html) берется из кэша без разбора html
+        cache = get_result_cache() if self.use_cache and not email_data.debug else None
+        html_key = cache.key(email_data.html) if cache else None
+        cached = self._timed('cache', cache.get, html_key) if cache else None
+        if cached is not None:
+            email_data.rate_tables = cached
+            email_data.html = None
+            logger.print(f"Таблицы ставок взяты из кэша: <{len(cached)}>.")
+            return
+
+        soup, spans = self._timed('split', self.split_stage, email_data.html)
+
+        # та же цитата в другой цепочке: последнее сообщение совпадает с уже обработанным
+        last_message_key = cache.key_from_pieces(spans.pieces(with_ids=False)) if cache else None
+        cached = self._timed('cache', cache.get, last_message_key) if cache else None
+        if cached is not None:
+            email_data.rate_tables = cached
+            logger.print(f"Таблицы ставок взяты из кэша: <{len(cached)}>.")
+        else:
+            tables_rows = self._timed('detect', self.detect_stage, spans)
+            rate_tables = self._timed('normalize', self.normalize_stage, tables_rows)
+
+            # если хотя бы одну таблицу не удалось обработать, пропускается все письмо
+            if rate_tables is None:
+                logger.print('ОШИБКА! Одну из таблиц ставок не удалось обработать. Письмо не будет обработано.')
+                email_data.rate_tables = []
+            else:
+                email_data.rate_tables = rate_tables
+                logger.print(f"Успешно обработано <{len(rate_tables)}> таблиц ставок.")
+
+        if cache:
+            cache.put(last_message_key, email_data.rate_tables)
+            cache.put(html_key, email_data.rate_tables)
+
+        if email_data.debug:
+            email_data.keep_parse_results(soup, spans)
+        else:
+            email_data.html = None
+
+    def process(self, source: 'MessageSource') -> 'EmailData':
+        """decode -> split -> detect -> normalize; дерево разбора после обработки освобождается"""
+        email_data = self.decode(source)
+        if email_data.has_html:
+            logger.print("Вычисление таблиц ставок")
+            self.extract(email_data)
+        email_data.release_parse_tree()
+        return email_data
+
+    def export(self, email_data: 'EmailData', extension: Literal['csv', 'xml'],
+               folder: str, filename: str) -> list[str]:
+        return self._timed('export', self.export_stage, email_data, extension, folder, filename)
+
+    def report(self) -> str:
+        """Время по стадиям: всего, вызовов, среднее"""
+        lines = []
+        for stage, total in self.timings.items():
+            calls = self.calls[stage]
+            lines.append(f'{stage:<10} {total:8.3f}s {calls:7d} вызовов {total / calls * 1000:8.3f} ms')
+        return '\n'.join(lines)
+
+
+default_pipeline = Pipeline()
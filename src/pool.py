@@ -0,0 +1,109 @@
+import traceback
+from collections import Counter
+from typing import Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.logger import logger
+from src.sources import MessageSource
+from src.pipeline import Pipeline, default_pipeline
+
+
+def process_source(source: MessageSource, pipeline: Optional[Pipeline] = None) -> dict:
+    """
+    Обработка одного письма (decode -> split -> detect -> normalize) - выполняется в рабочем процессе;
+    Результат - словарь {'email_data': EmailData | None, 'log': [...], 'error': str | None}
+    """
+
+    logger.clear()
+    try:
+        email_data = (pipeline or default_pipeline).process(source)
+        return {'email_data': email_data, 'log': list(logger.data), 'error': None}
+    except Exception:
+        error = traceback.format_exc()
+        logger.print(error)
+        return {'email_data': None, 'log': list(logger.data), 'error': error}
+    finally:
+        logger.clear()
+
+
+class MessagePool:
+    """
+    Параллельная обработка писем (разбор html -> таблицы ставок) в пуле процессов;
+    На вход - источники писем (src.sources), на выход - результаты в том же порядке, что и на входе;
+    Ошибка (или падение рабочего процесса) на одном письме дает результат с 'error' только для этого письма,
+    поэтому решение об отметке прочитанным / удалении файла принимается по каждому письму отдельно:
+    при падении процесса пул пересоздается, а письма, прерванные вместе с ним, отправляются повторно
+
+    workers=0 - обработка в текущем процессе, без пула; None - по числу процессоров;
+    pipeline - конвейер обработки, по умолчанию default_pipeline; передается в рабочие процессы вместе с письмом,
+    поэтому его стадии - функции уровня модуля (не lambda);
+    counters - счетчики: 'messages' (всего), 'errors', 'prefiltered' (отсеяны быстрой проверкой без разбора html)
+    """
+
+    def __init__(self, workers: Optional[int] = None, pipeline: Optional[Pipeline] = None):
+        self.workers = workers
+        self.pipeline = pipeline or default_pipeline
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.counters = Counter()
+        if workers != 0:
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def _count(self, results: List[dict]) -> List[dict]:
+        for result in results:
+            self.counters['messages'] += 1
+            if result['error'] is not None:
+                self.counters['errors'] += 1
+            elif result['email_data'].prefiltered:
+                self.counters['prefiltered'] += 1
+        return results
+
+    def _submit(self, sources: List[MessageSource], indexes: Iterable[int], results: List[Optional[dict]]) -> List[int]:
+        """Обрабатывает письма sources[i] в пуле; возвращает индексы писем, прерванных падением рабочего процесса"""
+        futures = {i: self._executor.submit(process_source, sources[i], self.pipeline) for i in indexes}
+        broken = []
+        for i, future in futures.items():
+            try:
+                results[i] = future.result()
+            except BrokenProcessPool:
+                broken.append(i)
+            except Exception:  # например, результат не удалось передать из рабочего процесса
+                error = traceback.format_exc()
+                results[i] = {'email_data': None, 'log': [error], 'error': error}
+        if broken:
+            self._restart()
+        return broken
+
+    def process(self, sources: Iterable[MessageSource]) -> List[dict]:
+        sources = list(sources)
+        if self._executor is None:
+            return self._count([process_source(source, self.pipeline) for source in sources])
+
+        results: List[Optional[dict]] = [None] * len(sources)
+        broken = self._submit(sources, range(len(sources)), results)
+
+        # при падении процесса прерываются все незавершенные письма: они отправляются повторно, а если пул
+        # падает снова - по одному, чтобы ошибка досталась только письму, на котором процесс падает
+        if broken:
+            broken = self._submit(sources, broken, results)
+        for i in broken:
+            if self._submit(sources, [i], results):
+                error = f'Рабочий процесс аварийно завершился при обработке письма {sources[i].key}\n'
+                results[i] = {'email_data': None, 'log': [error], 'error': error}
+        return self._count(results)
+
+    def _restart(self) -> None:
+        if self._executor is not None and getattr(self._executor, '_broken', False):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> 'MessagePool':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
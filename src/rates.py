@@ -0,0 +1,120 @@
+import io
+import csv
+import math
+from array import array
+from typing import Iterator, Optional, TextIO
+from xml.sax.saxutils import escape
+
+RATE_COLUMNS = ('наименование', 'ставка', 'вход')
+
+
+class RateRow:
+    """Строка таблицы ставок: услуга (наименование 1С), ставка, вход; нет числа - nan"""
+
+    __slots__ = ('service', 'rate', 'entry')
+
+    def __init__(self, service: str, rate: float, entry: float):
+        self.service = service
+        self.rate = rate
+        self.entry = entry
+
+    def __repr__(self) -> str:
+        return f'RateRow({self.service!r}, {self.rate!r}, {self.entry!r})'
+
+
+class RateTable:
+    """
+    Таблица ставок одного письма, хранится по столбцам: услуги - список строк, ставки и входы - array('d');
+    columns - порядок столбцов, как в заголовке исходной таблицы (сохраняется при выгрузке в csv/xml);
+    pandas не нужен: to_dataframe() импортирует его только по запросу
+    """
+
+    __slots__ = ('columns', 'services', 'rates', 'entries')
+
+    def __init__(self, columns: tuple = RATE_COLUMNS):
+        self.columns = tuple(columns)
+        self.services: list[str] = []
+        self.rates = array('d')
+        self.entries = array('d')
+
+    def append(self, service: str, rate: Optional[float], entry: Optional[float]) -> None:
+        self.services.append(service)
+        self.rates.append(math.nan if rate is None else rate)
+        self.entries.append(math.nan if entry is None else entry)
+
+    def to_dict(self) -> dict:
+        return {'columns': list(self.columns), 'services': self.services,
+                'rates': self.rates.tolist(), 'entries': self.entries.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RateTable':
+        table = cls(data['columns'])
+        table.services = list(data['services'])
+        table.rates = array('d', data['rates'])
+        table.entries = array('d', data['entries'])
+        return table
+
+    def __len__(self) -> int:
+        return len(self.services)
+
+    def __getitem__(self, i: int) -> RateRow:
+        return RateRow(self.services[i], self.rates[i], self.entries[i])
+
+    def __iter__(self) -> Iterator[RateRow]:
+        for row in zip(self.services, self.rates, self.entries):
+            yield RateRow(*row)
+
+    def __repr__(self) -> str:
+        return f'RateTable({len(self)} rows)'
+
+    def column(self, name: str):
+        return {'наименование': self.services, 'ставка': self.rates, 'вход': self.entries}[name]
+
+    @staticmethod
+    def format_value(value) -> str:
+        """Значение ячейки как в pandas: nan - пустая строка, float - repr"""
+        if isinstance(value, float):
+            return '' if math.isnan(value) else repr(value)
+        return value
+
+    def records(self) -> Iterator[list[str]]:
+        """Строки таблицы в порядке columns, значения уже отформатированы"""
+        columns = [self.column(name) for name in self.columns]
+        for values in zip(*columns):
+            yield [self.format_value(value) for value in values]
+
+    def write_csv(self, file: TextIO) -> None:
+        """Пишет таблицу в CSV построчно (в открытый файл или буфер)"""
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(self.columns)
+        writer.writerows(self.records())
+
+    def write_xml(self, file: TextIO) -> None:
+        """Тот же формат, что и DataFrame.to_xml(encoding='utf-8', index=False), построчно"""
+        file.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        if not self.services:
+            file.write('<data/>')
+            return
+        file.write('<data>\n')
+        for record in self.records():
+            file.write('  <row>\n')
+            for name, value in zip(self.columns, record):
+                file.write(f'    <{name}>{escape(value)}</{name}>\n' if value else f'    <{name}/>\n')
+            file.write('  </row>\n')
+        file.write('</data>')
+
+    def to_csv(self) -> str:
+        buffer = io.StringIO()
+        self.write_csv(buffer)
+        return buffer.getvalue()
+
+    def to_xml(self) -> str:
+        buffer = io.StringIO()
+        self.write_xml(buffer)
+        return buffer.getvalue()
+
+    def to_dataframe(self):
+        """pandas.DataFrame с теми же столбцами (pandas импортируется только здесь)"""
+        import pandas as pd
+
+        return pd.DataFrame({name: list(self.column(name)) for name in self.columns}, columns=list(self.columns))
@@ -0,0 +1,151 @@
+from collections import deque
+from typing import Iterable, Optional, Sequence
+
+from src.parameters import REPLY_HEADER_DIALECTS, REPLY_HEADER_OPTIONAL_DIALECTS, REPLY_HEADER_EXTRA_DIALECTS
+
+
+class ReplyHeaderPattern:
+    """
+    Скомпилированный диалект заголовка ответа: последовательность строк с маркерами;
+    Проверка строки - последовательный str.find маркеров, без регулярных выражений и возвратов по символам,
+    поэтому время проверки линейно по длине строк
+    """
+
+    def __init__(self, name: str, steps: Iterable[tuple[Sequence[str], bool]]):
+        self.name = name
+        self.steps = [(tuple(marker.lower() for marker in markers), required) for markers, required in steps]
+        self.max_lines = len(self.steps)
+
+    @staticmethod
+    def _line_matches(line: str, markers: tuple[str, ...]) -> bool:
+        position = 0
+        for marker in markers:
+            position = line.find(marker, position)
+            if position == -1:
+                return False
+            position += len(marker)
+        return True
+
+    def match(self, lines: Sequence[str], start: int = 0) -> int:
+        """
+        Проверяет заголовок с начала строки lines[start] (строки в нижнем регистре);
+        Возвращает число занятых заголовком строк или 0; необязательная строка сначала пробуется, как в regex
+        """
+
+        def _match(step: int, line: int) -> int:
+            if step == len(self.steps):
+                return line - start
+            markers, required = self.steps[step]
+            if line < len(lines) and self._line_matches(lines[line], markers):
+                matched = _match(step + 1, line + 1)
+                if matched:
+                    return matched
+            return 0 if required else _match(step + 1, line)
+
+        return _match(0, start)
+
+
+class ReplyHeaderEngine:
+    """
+    Набор диалектов заголовков ответа, компилируется один раз;
+    По умолчанию - REPLY_HEADER_DIALECTS и включенные в REPLY_HEADER_EXTRA_DIALECTS дополнительные диалекты
+    """
+
+    def __init__(self, dialects: dict = None):
+        if dialects is None:
+            dialects = dict(REPLY_HEADER_DIALECTS,
+                            **{name: REPLY_HEADER_OPTIONAL_DIALECTS[name] for name in REPLY_HEADER_EXTRA_DIALECTS})
+        self.patterns = [ReplyHeaderPattern(name, steps) for name, steps in dialects.items()]
+        self.window = max((p.max_lines for p in self.patterns), default=1)
+
+    def match(self, lines: Sequence[str], start: int = 0) -> int:
+        """Число строк заголовка, начинающегося со строки lines[start], или 0"""
+        for pattern in self.patterns:
+            matched = pattern.match(lines, start)
+            if matched:
+                return matched
+        return 0
+
+    def split(self, text: str) -> list[str]:
+        """
+        Делит текст по заголовкам ответа (аналог re.split): заголовок начинается с начала строки
+        и заканчивается в конце своей последней строки; сами заголовки в результат не входят
+        """
+
+        raw_lines = text.split('\n')
+        lines = [line.lower() for line in raw_lines]
+        parts = []
+        part_start = 0
+        line_start = 0
+        i = 0
+        while i < len(lines):
+            matched = self.match(lines[i:i + self.window])
+            if matched:
+                parts.append(text[part_start:line_start])
+                header_end = line_start + sum(len(line) + 1 for line in raw_lines[i:i + matched]) - 1
+                part_start = header_end
+                line_start = header_end + 1
+                i += matched
+            else:
+                line_start += len(raw_lines[i]) + 1
+                i += 1
+        parts.append(text[part_start:])
+        return parts
+
+
+DEFAULT_ENGINE = ReplyHeaderEngine()
+
+
+class ReplyBoundaryScanner:
+    """
+    Потоково (по кускам текста) ищет первый заголовок ответа, на котором заканчивается последнее сообщение;
+    Заголовок начинается с начала строки и занимает не более engine.window строк,
+    поэтому хранится только окно из последних строк
+    """
+
+    def __init__(self, engine: ReplyHeaderEngine = None):
+        self.engine = engine or DEFAULT_ENGINE
+        self._offsets: deque[int] = deque()  # позиции начала строк окна в потоке
+        self._lines: deque[str] = deque()  # строки окна в нижнем регистре
+        self._tail: list[str] = []  # куски незавершенной строки
+        self._tail_offset = 0
+
+    def _push(self, offset: int, line: str) -> Optional[int]:
+        self._offsets.append(offset)
+        self._lines.append(line.lower())
+        if len(self._lines) == self.engine.window:
+            if self.engine.match(self._lines):
+                return self._offsets[0]
+            self._offsets.popleft()
+            self._lines.popleft()
+        return None
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """Добавляет кусок текста; возвращает позицию начала заголовка ответа, если он уже найден"""
+
+        newline = chunk.find('\n')
+        if newline == -1:
+            self._tail.append(chunk)
+            return None
+        self._tail.append(chunk[:newline])
+        line = ''.join(self._tail)
+        boundary = self._push(self._tail_offset, line)
+        offset = self._tail_offset + len(line) + 1
+        start = newline + 1
+        while boundary is None and (newline := chunk.find('\n', start)) != -1:
+            boundary = self._push(offset, chunk[start:newline])
+            offset += newline - start + 1
+            start = newline + 1
+        self._tail = [chunk[start:]]
+        self._tail_offset = offset
+        return boundary
+
+    def close(self) -> Optional[int]:
+        """Конец потока: проверяет оставшиеся строки (последняя строка может быть без перевода строки)"""
+
+        offsets = list(self._offsets) + [self._tail_offset]
+        lines = list(self._lines) + [''.join(self._tail).lower()]
+        for i in range(len(lines)):
+            if self.engine.match(lines, i):
+                return offsets[i]
+        return None
@@ -0,0 +1,186 @@
+import time
+import queue
+import smtplib
+import threading
+import traceback
+from typing import Callable, Literal, Optional
+from email.mime.text import MIMEText
+
+from src.logger import logger
+from src.utils import build_email
+
+_STOP = object()  # сигнал завершения для рабочих потоков
+
+
+class SmtpSender:
+    """
+    Фоновая отправка писем, чтобы медленный SMTP сервер не блокировал обработку входящей почты:
+    - ограниченная очередь (queue_size): send() ставит письмо в очередь и сразу возвращается;
+    - workers рабочих потоков, у каждого свое постоянное авторизованное соединение (STARTTLS + LOGIN один раз);
+    - соединение, простаивающее дольше idle_timeout секунд, закрывается и открывается заново при следующем письме;
+    - при временной ошибке отправки до retries повторов с экспоненциальной задержкой, с переподключением;
+      постоянная (ответ сервера 5xx: адрес отклонен, письмо отклонено) - без повторов;
+    - close() дожидается отправки всех писем из очереди
+
+    smtp_factory - фабрика соединения (по умолчанию smtplib.SMTP), starttls=False - для локального SMTP (aiosmtpd)
+    """
+
+    def __init__(self,
+                 email_user: str,
+                 email_pass: Optional[str],
+                 smtp_server: str = "smtp.gmail.com",
+                 smtp_port: int = 587,
+                 workers: int = 1,
+                 queue_size: int = 100,
+                 retries: int = 3,
+                 min_backoff: float = 1,
+                 max_backoff: float = 60,
+                 idle_timeout: float = 60,
+                 starttls: bool = True,
+                 smtp_factory: Callable[[str, int], smtplib.SMTP] = smtplib.SMTP):
+        self.email_user = email_user
+        self.email_pass = email_pass
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.retries = retries
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.starttls = starttls
+        self.smtp_factory = smtp_factory
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._threads = [threading.Thread(target=self._worker, name=f'smtp-sender-{i}', daemon=True)
+                         for i in range(workers)]
+        self._started = False
+        self._closed = False
+        self.sent = 0
+        self.failed = 0
+        self._counters_lock = threading.Lock()  # счетчики меняют все рабочие потоки
+
+    # ------------------------------------------------------------------------------------------------------ public
+
+    def start(self) -> 'SmtpSender':
+        if not self._started:
+            self._started = True
+            for thread in self._threads:
+                thread.start()
+        return self
+
+    def send(self,
+             email_text: str,
+             email_format: Literal['plain', 'html'],
+             recipient_email: str,
+             subject: str,
+             timeout: Optional[float] = None) -> bool:
+        """
+        Ставит письмо в очередь на отправку (аргументы как у send_email);
+        Если очередь заполнена, ждет не дольше timeout секунд; возвращает False, если письмо не принято
+        """
+        if self._closed:
+            raise RuntimeError('SmtpSender закрыт')
+        self.start()
+        msg = build_email(email_text, email_format, recipient_email, subject, self.email_user)
+        try:
+            self._queue.put(msg, timeout=timeout)
+            return True
+        except queue.Full:
+            logger.print(f'Очередь исходящих писем заполнена, письмо для {recipient_email} не отправлено')
+            return False
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Дожидается отправки всех писем из очереди и закрывает соединения"""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._started:
+            return
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def __enter__(self) -> 'SmtpSender':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------------------------------------------ worker
+
+    def _connect(self) -> smtplib.SMTP:
+        server = self.smtp_factory(self.smtp_server, self.smtp_port)
+        try:
+            if self.starttls:
+                server.starttls()  # Запускаем шифрование
+            if self.email_pass:
+                server.login(self.email_user, self.email_pass)  # Авторизуемся
+        except Exception:
+            self._disconnect(server)
+            raise
+        return server
+
+    @staticmethod
+    def _disconnect(server: Optional[smtplib.SMTP]) -> None:
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        """Ответ сервера 5xx: повтор того же письма даст ту же ошибку"""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in error.recipients.values())
+        return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+    def _count(self, counter: str) -> None:
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _deliver(self, server: Optional[smtplib.SMTP], msg: MIMEText) -> Optional[smtplib.SMTP]:
+        """Отправляет письмо с повторами при временных ошибках; возвращает живое соединение (или None)"""
+        backoff = self.min_backoff
+        for attempt in range(self.retries + 1):
+            try:
+                if server is None:
+                    server = self._connect()
+                server.send_message(msg)
+                self._count('sent')
+                return server
+            except Exception as error:
+                logger.print(traceback.format_exc())
+                if self._is_permanent(error):
+                    # соединение исправно (smtplib сбрасывает транзакцию) - следующие письма идут через него же;
+                    # при ошибке авторизации соединения нет (None)
+                    self._count('failed')
+                    logger.print(f"Письмо для {msg['To']} отклонено сервером, повторов не будет")
+                    return server
+                self._disconnect(server)
+                server = None
+                if attempt < self.retries:
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+        self._count('failed')
+        logger.print(f"Письмо для {msg['To']} не отправлено после {self.retries + 1} попыток")
+        return None
+
+    def _worker(self) -> None:
+        server = None
+        while True:
+            try:
+                msg = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # простаивающее соединение сервер все равно закроет - закрываем сами
+                self._disconnect(server)
+                server = None
+                continue
+            try:
+                if msg is _STOP:
+                    self._disconnect(server)
+                    return
+                server = self._deliver(server, msg)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,97 @@
+import os
+import mailbox
+from typing import Iterator, Optional, Protocol
+
+from src.models import EmailData
+
+MESSAGE_EXTENSIONS = ('.msg', '.eml')
+
+
+class MessageSource(Protocol):
+    """
+    Источник письма для Pipeline: key - идентификатор (имя файла, UID, '<архив>::<письмо>'), size - размер в байтах,
+    load() - стадия decode (байты / файл -> EmailData); объект передается в процессы пула, поэтому хранит
+    путь или байты, а не открытый файл
+    """
+
+    key: str
+    size: int
+
+    def load(self) -> EmailData: ...
+
+
+class RawMessage:
+    """Письмо RFC 822 в байтах: результат IMAP FETCH, письмо из mbox или .eml из архива"""
+
+    __slots__ = ('data', 'key', 'size')
+
+    def __init__(self, data: bytes, key: str = ''):
+        self.data = data
+        self.key = key
+        self.size = len(data)
+
+    def load(self) -> EmailData:
+        return EmailData.from_bytes(self.data)
+
+
+class EmlFile:
+    """.eml файл; читается при load() (в рабочем процессе пула)"""
+
+    __slots__ = ('path', 'key')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key = os.path.abspath(path)
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def load(self) -> EmailData:
+        with open(self.path, 'rb') as file:
+            return EmailData.from_bytes(file.read())
+
+
+class MsgFile:
+    """.msg файл Outlook: путь или содержимое файла (.msg из архива, запрос к демону)"""
+
+    __slots__ = ('source', 'key')
+
+    def __init__(self, source: str | bytes, key: Optional[str] = None):
+        self.source = source
+        self.key = key or ('' if isinstance(source, bytes) else os.path.abspath(source))
+
+    @property
+    def size(self) -> int:
+        return len(self.source) if isinstance(self.source, bytes) else os.path.getsize(self.source)
+
+    def load(self) -> EmailData:
+        return EmailData.from_msg_file(self.source)
+
+
+def message_format(path: str) -> Optional[str]:
+    """'msg' | 'eml' по расширению файла, None - не письмо"""
+    extension = os.path.splitext(path)[1].lower()
+    return extension[1:] if extension in MESSAGE_EXTENSIONS else None
+
+
+def file_source(path: str) -> MessageSource:
+    """Источник для .msg / .eml файла"""
+    return MsgFile(path) if message_format(path) == 'msg' else EmlFile(path)
+
+
+def data_source(data: bytes, msg_format: str, key: str = '') -> MessageSource:
+    """Источник для содержимого .msg / .eml файла"""
+    return MsgFile(data, key) if msg_format == 'msg' else RawMessage(data, key)
+
+
+def mbox_sources(path: str, skip=()) -> Iterator[tuple[int, MessageSource]]:
+    """Письма mbox (номер в файле, источник), ключ - '<путь>::<номер>'; письма из skip не читаются"""
+    box = mailbox.mbox(path, create=False)
+    try:
+        for i, box_key in enumerate(box.iterkeys()):
+            key = f'{os.path.abspath(path)}::{i}'
+            if key not in skip:
+                yield i, RawMessage(box.get_bytes(box_key), key)
+    finally:
+        box.close()
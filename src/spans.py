@@ -0,0 +1,51 @@
+from typing import Iterator, Optional
+
+
+class HtmlSpans:
+    """
+    Документ html с верхнеуровневыми таблицами в виде ссылок, без копирования текста:
+    сегменты - срезы text между таблицами, таблицы - элементы tables_info (ключи 'table', 'start', 'end', '_id');
+    end - граница документа в text (например, конец последнего письма цепочки);
+    replacement() (таблицы заменены на '\\n<UUID>\\n') и restored() (UUID заменены обратно на таблицы)
+    собираются одним join
+    """
+
+    __slots__ = ('text', 'tables', 'end')
+
+    def __init__(self, text: str, tables: list, end: Optional[int] = None):
+        self.text = text
+        self.tables = tables
+        self.end = len(text) if end is None else end
+
+    def pieces(self, with_ids: bool = True) -> Iterator[str]:
+        position = 0
+        for table in self.tables:
+            yield self.text[position:table['start']]
+            yield '\n'
+            yield table['_id'] if with_ids else table['table']
+            yield '\n'
+            position = table['end'] + 1
+        yield self.text[position:self.end]
+
+    def replacement(self) -> str:
+        return ''.join(self.pieces(with_ids=True))
+
+    def restored(self) -> str:
+        return ''.join(self.pieces(with_ids=False))
+
+    def cut(self, offset: int) -> 'HtmlSpans':
+        """
+        Начало документа длиной offset символов replacement(), как replacement()[:offset];
+        Таблица, UUID которой не поместился целиком, в результат не попадает
+        """
+        position = 0  # позиция в replacement
+        segment_start = 0  # позиция в text
+        for i, table in enumerate(self.tables):
+            segment_length = table['start'] - segment_start
+            if offset <= position + segment_length:
+                return HtmlSpans(self.text, self.tables[:i], segment_start + offset - position)
+            position += segment_length + len(table['_id']) + 2
+            if offset < position:
+                return HtmlSpans(self.text, self.tables[:i], table['start'])
+            segment_start = table['end'] + 1
+        return HtmlSpans(self.text, self.tables, min(segment_start + offset - position, self.end))
@@ -1,20 +1,30 @@
 import re
+import codecs
 import traceback
+from collections import OrderedDict
 
 import smtplib
-import chardet
-import pandas as pd
 from uuid import uuid4
+from html import unescape
 from typing import Literal
-from bs4 import BeautifulSoup
-from typing import List, Optional, Tuple, Union
+from bs4 import BeautifulSoup, FeatureNotFound, Tag
+from typing import Iterator, List, Optional, Tuple, Union
 
 import imaplib
 from email.message import Message
 from email.header import decode_header
+from email.utils import parseaddr
 from email.mime.text import MIMEText
 
-from src.parameters import SERVICES_KEYWORDS, FIELDS_ALIAS, FIELDS_ALIAS_REVERSED, STOPWORDS
+from src.parameters import (SERVICES_KEYWORDS, FIELDS_ALIAS, FIELDS_ALIAS_REVERSED, STOPWORDS, HTML_PARSER,
+                            IMAP_FETCH_CHUNK_SIZE, ENCODING_SAMPLE_SIZE, ENCODING_CACHE_SIZE)
+from src.reply_headers import ReplyBoundaryScanner
+from src.matcher import KeywordMatcher
+from src.rates import RATE_COLUMNS, RateTable
+from src.spans import HtmlSpans
+
+SERVICES_MATCHER = KeywordMatcher(SERVICES_KEYWORDS)  # строится один раз при импорте
+_STOPWORDS_REGEX = re.compile('|'.join(STOPWORDS), flags=re.IGNORECASE)
 
 
 # ---------------------------------------------------------------------------------------------------------------- email
@@ -31,38 +41,144 @@ def connect_to_imap(email_user: str, email_pass: str, imap_server: str,
         raise Exception(f"Ошибка подключения к IMAP: {str(e)}")
 
 
-def get_unseen_messages(mail: imaplib.IMAP4_SSL) -> List[bytes]:
-    """Возвращает список ID непрочитанных писем"""
-    status, messages = mail.search(None, 'UNSEEN')  # Поиск непрочитанных писем
+def get_unseen_uids(mail: imaplib.IMAP4, after_uid: int = 0) -> List[bytes]:
+    """
+    Возвращает список UID непрочитанных писем (UID, в отличие от порядковых номеров, не сдвигаются);
+    after_uid - запрашиваются только письма с UID больше указанного
+    """
+    if after_uid:
+        status, messages = mail.uid('SEARCH', None, 'UID', f'{after_uid + 1}:*', 'UNSEEN')
+    else:
+        status, messages = mail.uid('SEARCH', None, 'UNSEEN')
     if status != 'OK':
         print("Ошибка при поиске писем")
         return []
-    message_ids: List[bytes] = messages[0].split()  # Разделение строки ID на список
-    return message_ids
+    # диапазон "n:*" всегда включает последнее письмо ящика, даже если его UID меньше n
+    return [uid for uid in messages[0].split() if int(uid) > after_uid]
+
+
+def get_uidvalidity(mail: imaplib.IMAP4) -> Optional[int]:
+    """UIDVALIDITY выбранной папки: при его смене ранее полученные UID недействительны"""
+    _, data = mail.response('UIDVALIDITY')
+    if data and data[0]:
+        return int(data[0])
+    status, data = mail.status('INBOX', '(UIDVALIDITY)')
+    match = re.search(rb'UIDVALIDITY (\d+)', data[0] or b'') if status == 'OK' else None
+    return int(match.group(1)) if match else None
+
+
+def uid_sequence_set(uids: List[bytes]) -> str:
+    """Сжимает список UID в sequence set IMAP: [101, 102, 103, 105] -> '101:103,105'"""
+    numbers = sorted({int(uid) for uid in uids})
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ','.join(f'{first}:{last}' if first != last else str(first) for first, last in ranges)
+
+
+def fetch_messages_by_uid(mail: imaplib.IMAP4, uids: List[bytes],
+                          chunk_size: int = IMAP_FETCH_CHUNK_SIZE) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Получает письма пачками по chunk_size одной командой UID FETCH на пачку (без отметки как прочитанное);
+    Возвращает пары (UID, байты письма) в порядке uids
+    """
+    for i in range(0, len(uids), chunk_size):
+        chunk = uids[i:i + chunk_size]
+        status, data = mail.uid('FETCH', uid_sequence_set(chunk), '(UID BODY.PEEK[])')
+        if status != 'OK':
+            print("Ошибка при получении писем")
+            continue
+        messages = {}
+        for item in data:
+            if isinstance(item, tuple):
+                match = re.search(rb'UID (\d+)', item[0])
+                if match:
+                    messages[match.group(1)] = item[1]
+        for uid in chunk:
+            if uid in messages:
+                yield uid, messages[uid]
+
 
+def mark_seen(mail: imaplib.IMAP4, uids: List[bytes]) -> None:
+    """Отмечает письма как прочитанные одной командой UID STORE"""
+    if uids:
+        mail.uid('STORE', uid_sequence_set(uids), '+FLAGS', '(\\Seen)')
 
-def detect_encoding(body: bytes) -> str:
-    """Определяет кодировку для переданных байтов"""
 
-    # 1. Определяем через chardet
-    detection = chardet.detect(body)
+_META_CHARSET_REGEX = re.compile(rb'<meta[^>]{0,200}?charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.-]+)', flags=re.IGNORECASE)
+_ENCODING_CACHE: OrderedDict = OrderedDict()  # (отправитель, заявленная кодировка) -> кодировка
+
+
+def _valid_encoding(body: bytes, encoding: Optional[str]) -> Optional[str]:
+    """Возвращает нормализованное имя кодировки, если body декодируется ей без ошибок"""
+    if not encoding:
+        return None
+    try:
+        name = codecs.lookup(encoding.strip().strip('"\'')).name
+        body.decode(name)
+        return name
+    except (LookupError, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _remember_encoding(cache_key: Optional[tuple], encoding: str) -> str:
+    if cache_key is not None:
+        _ENCODING_CACHE[cache_key] = encoding
+        _ENCODING_CACHE.move_to_end(cache_key)
+        if len(_ENCODING_CACHE) > ENCODING_CACHE_SIZE:
+            _ENCODING_CACHE.popitem(last=False)
+    return encoding
+
+
+def detect_encoding(body: bytes, declared: Optional[str] = None, sender: Optional[str] = None) -> str:
+    """
+    Определяет кодировку для переданных байтов, от дешевых способов к дорогим:
+    1) заявленная в Content-Type кодировка (declared), 2) <meta charset> в начале html, 3) строгий UTF-8,
+    4) кодировка, ранее определенная для этого отправителя и заявленной кодировки,
+    5) chardet по первым ENCODING_SAMPLE_SIZE байтам; каждая кодировка проверяется декодированием всего body
+    """
+
+    # 1. Заявленная кодировка
+    encoding = _valid_encoding(body, declared)
+    if encoding:
+        return encoding
+
+    # 2. <meta charset=...> / <meta http-equiv="Content-Type" content="text/html; charset=...">
+    meta = _META_CHARSET_REGEX.search(body, 0, 4096)
+    encoding = meta and _valid_encoding(body, meta.group(1).decode('ascii'))
+    if encoding:
+        return encoding
+
+    # 3. Строгий UTF-8 (ASCII - его частный случай)
+    if _valid_encoding(body, 'utf-8'):
+        return 'utf-8'
+
+    # 4. Кэш по отправителю
+    cache_key = (sender, declared) if sender else None
+    encoding = _valid_encoding(body, _ENCODING_CACHE.get(cache_key)) if cache_key else None
+    if encoding:
+        _ENCODING_CACHE.move_to_end(cache_key)
+        return encoding
+
+    # 5. chardet по ограниченному фрагменту
+    import chardet
+
+    detection = chardet.detect(body[:ENCODING_SAMPLE_SIZE])
     encoding = detection['encoding'] if detection['confidence'] > 0.7 else None
+    encoding = _valid_encoding(body, encoding)
     if encoding:
-        try:
-            body.decode(encoding)  # Проверяем, работает ли
-            return encoding
-        except UnicodeDecodeError:
-            pass
-
-    # 2. Fallback-кодировки
-    for fallback_encoding in ('utf-8', 'windows-1251', 'iso-8859-1'):
-        try:
-            body.decode(fallback_encoding)  # Проверяем
-            return fallback_encoding
-        except UnicodeDecodeError:
-            continue
+        return _remember_encoding(cache_key, encoding)
+
+    # 6. Fallback-кодировки
+    for fallback_encoding in ('windows-1251', 'iso-8859-1'):
+        encoding = _valid_encoding(body, fallback_encoding)
+        if encoding:
+            return _remember_encoding(cache_key, encoding)
 
-    # 3. Если ничего не подошло, возвращаем utf-8
+    # 7. Если ничего не подошло, возвращаем utf-8
     return 'utf-8'
 
 
@@ -80,20 +196,26 @@ def decode_subject(subject: Optional[str]) -> str:
     return subject_text
 
 
+def _sender_address(email_message: Message) -> Optional[str]:
+    _, address = parseaddr(email_message.get("From", ""))
+    return address.lower() or None
+
+
 def extract_text_content(email_message: Message) -> Optional[str]:
     """Извлекает текстовую часть письма"""
+    sender = _sender_address(email_message)
     if email_message.is_multipart():  # True, если письмо состоит из нескольких частей (текст + HTML + вложения + ..)
         for part in email_message.walk():  # part: <class 'email.message.Message'>
             if part.get_content_type() == "text/plain":  # text/plain - обычный текст письма
                 body: bytes = part.get_payload(decode=True)
                 if body:
-                    encoding = detect_encoding(body)
+                    encoding = detect_encoding(body, declared=part.get_content_charset(), sender=sender)
                     decoded: str = body.decode(encoding, errors='ignore')
                     return decoded
     else:
         body = email_message.get_payload(decode=True)
         if body:
-            encoding = detect_encoding(body)
+            encoding = detect_encoding(body, declared=email_message.get_content_charset(), sender=sender)
             return body.decode(encoding, errors='ignore')
     return None
 
@@ -101,21 +223,46 @@ def extract_text_content(email_message: Message) -> Optional[str]:
 def extract_html_content(email_message: Message) -> Optional[str]:
     """Извлекает HTML часть письма"""
     html_content: Optional[bytes] = None
+    html_part: Message = email_message
     if email_message.is_multipart():
         for part in email_message.walk():
             if part.get_content_type() == "text/html":
                 html_content: bytes = part.get_payload(decode=True)
+                html_part = part
                 break
     elif email_message.get_content_type() == "text/html":
         html_content: bytes = email_message.get_payload(decode=True)
 
     if html_content:
-        encoding = detect_encoding(html_content)
+        encoding = detect_encoding(html_content, declared=html_part.get_content_charset(),
+                                   sender=_sender_address(email_message))
         html_decoded: str = html_content.decode(encoding, errors='ignore')
         return html_decoded
     return None
 
 
+def decode_html_body(html_body: Optional[bytes | str], sender: Optional[str] = None) -> Optional[str]:
+    """HTML часть .msg (extract_msg отдает htmlBody байтами) -> str; кодировка - по detect_encoding"""
+    if not html_body:
+        return None
+    if isinstance(html_body, str):
+        return html_body
+    return html_body.decode(detect_encoding(html_body, sender=sender), errors='ignore')
+
+
+def build_email(email_text: str,
+                email_format: Literal['plain', 'html'],
+                recipient_email: str,
+                subject: str,
+                email_user: str) -> MIMEText:
+    """Создает объект письма для отправки"""
+    msg = MIMEText(email_text, email_format, 'utf-8')
+    msg['Subject'] = subject
+    msg['From'] = email_user
+    msg['To'] = recipient_email
+    return msg
+
+
 def send_email(email_text: str,
                email_format: Literal['plain', 'html'],
                recipient_email: str,
@@ -142,10 +289,7 @@ def send_email(email_text: str,
     """
     try:
         # Создаем объект письма
-        msg = MIMEText(email_text, email_format, 'utf-8')
-        msg['Subject'] = subject
-        msg['From'] = email_user
-        msg['To'] = recipient_email
+        msg = build_email(email_text, email_format, recipient_email, subject, email_user)
 
         # Устанавливаем соединение с SMTP сервером
         with smtplib.SMTP(smtp_server, smtp_port) as server:
@@ -162,141 +306,176 @@ def send_email(email_text: str,
 
 # --------------------------------------------------------------------------------------------------------------- tables
 
-def find_tables_positions(soup: BeautifulSoup) -> list:
-    """Извлекает из html-структуры (soup) список таблиц (контент, позиция начала, позиция конца) """
-
-    start = 0
-    tables_info = []
-    soup_tables = soup.find_all('table')
-    for table in soup_tables:
-        table_html = str(table)
-        find_ = str(soup).find(table_html, start)
-        if find_ != -1:
-            start = find_
-            end = find_ + len(table_html) - 1
-
-            # исключаем вложенные таблицы
-            end_of_last_table = tables_info[-1]['end'] if tables_info else 0
-            if end_of_last_table <= start:
-                tables_info.append({'table': table_html, 'start': start, 'end': end})
+_TAG_REGEX = re.compile(r'<[a-zA-Z/!?][^>]*>')
+_FIELD_ALIASES = [[alias.lower().strip() for alias in aliases] for aliases in FIELDS_ALIAS.values()]
 
-    return tables_info
 
-
-def replace_tables_with_uuid(soup: BeautifulSoup, tables_info: list) -> tuple[list, str]:
+def may_contain_rate_table(html_content: str) -> bool:
     """
-    Заменяет контент таблицы в html-структуре (soup) на UUID;
-    Принимает на вход soup-объект и tables_info (результат функции find_tables_positions);
-    Добавляет в tables_info ключ "_id"
+    Быстрая проверка перед разбором html: есть ли в письме <table> и все поля заголовка из FIELDS_ALIAS;
+    Проверяется весь html (а не только последнее сообщение), текст без тегов и с раскрытыми &-сущностями,
+    поэтому отсеиваются только письма, в которых таблицы ставок точно нет
     """
+    if '<table' not in html_content.lower():
+        return False
+    text = unescape(_TAG_REGEX.sub('', html_content)).lower()
+    return all(any(alias in text for alias in aliases) for aliases in _FIELD_ALIASES)
 
-    text = str(soup)
-    last_end = 0
-    replacement = ''
-    for i, table in enumerate(tables_info):
-        table['_id'] = str(uuid4())
-        replacement += text[last_end:table['start']] + '\n' + table['_id'] + '\n'
-        last_end = table['end'] + 1
-        if i == len(tables_info) - 1:
-            replacement += text[table['end'] + 1:]
 
-    return tables_info, replacement
+def make_soup(html_content: str) -> BeautifulSoup:
+    """Разбирает html один раз парсером HTML_PARSER; если он не установлен - стандартным html.parser"""
+    try:
+        return BeautifulSoup(html_content, HTML_PARSER)
+    except FeatureNotFound:
+        return BeautifulSoup(html_content, 'html.parser')
+
+
+def table_row_cells(tr: Tag) -> list[str]:
+    cells = []
+    for td in tr.find_all('td'):
+        # Извлекаем текст из всех тегов <p>
+        paragraphs = [p.get_text() for p in td.find_all('p')]
+        # Если найдено более одного абзаца, объединяем с переносами строк
+        if len(paragraphs) > 1:
+            cell_text = "\n".join(paragraphs)
+        elif paragraphs:
+            cell_text = paragraphs[0]
+        else:
+            cell_text = td.get_text(strip=True)
+        cells.append(cell_text)
+    return cells
 
 
-def replace_uuid_with_tables(replacement: str, tables_info: list):
-    """
-    Обратная функция replace_tables_with_uuid;
-    Принимает на вход replacement и tables_info (результат функции replace_tables_with_uuid);
-    Восстанавливает исходный html до замены таблиц на id
-    """
+def iter_table_rows(table: Tag) -> Iterator[Tag]:
+    """Строки <tr> таблицы (как table.find_all('tr'), с вложенными), по одной, без построения списка"""
+    for node in table.descendants:
+        if isinstance(node, Tag) and node.name == 'tr':
+            yield node
 
-    _ids = [t['_id'] for t in tables_info]
-    original_tables = [t['table'] for t in tables_info]
-    for _id, original_table in zip(_ids, original_tables):
-        replacement = replacement.replace(_id, original_table)
-    return replacement
 
+def read_rate_table_rows(table: Tag) -> Optional[list[list[str]]]:
+    """
+    Двухфазное чтение таблицы: сначала только первая строка сверяется с FIELDS_ALIAS (3 столбца),
+    остальные строки читаются, только если заголовок подошел; None - не таблица ставок
+    (в том числе, если в какой-то строке больше 3 ячеек)
+    """
+    rows = iter_table_rows(table)
+    first_row = next(rows, None)
+    if first_row is None:
+        return None
 
-def html_table_to_df(html_table: str) -> pd.DataFrame:
-    """ Замена стандартной pd.read_html. Разделяет построчно параграфы (в тегах <p>) """
+    header = table_row_cells(first_row)
+    if len(header) != 3 or not compare_fields_names(fields_alias=FIELDS_ALIAS, extracted_fields=header):
+        return None
 
-    soup = BeautifulSoup(html_table, 'html.parser')
-    table = soup.find('table')
+    result = [header]
+    for tr in rows:
+        cells = table_row_cells(tr)
+        if len(cells) > 3:
+            return None
+        result.append(cells)
+    return result
 
-    rows = []
-    for tr in table.find_all('tr'):
-        cells = []
-        for td in tr.find_all('td'):
-            # Извлекаем текст из всех тегов <p>
-            paragraphs = [p.get_text() for p in td.find_all('p')]
-            # Если найдено более одного абзаца, объединяем с переносами строк
-            if len(paragraphs) > 1:
-                cell_text = "\n".join(paragraphs)
-            elif paragraphs:
-                cell_text = paragraphs[0]
-            else:
-                cell_text = td.get_text(strip=True)
-            cells.append(cell_text)
-        rows.append(cells)
-
-    # raw[0] -> Header
-    df = pd.DataFrame(rows)
-    df.columns = df.iloc[0]
-    df = df.drop(df.index[0])
-    return df
-
-
-def extract_outer_html_tables(html_content: str) -> List[pd.DataFrame]:
-    """Извлекает только верхнеуровневые таблицы из HTML"""
-
-    if not html_content:
-        print('No html_content in extract_outer_html_tables')
-        return []
 
-    try:
-        soup = BeautifulSoup(html_content, "html.parser")
-        top_level_tables: list[str] = []
+# ------------------------------------------------------------------------------------------------------- postprocessing
 
-        # Смотрим только таблицы, у которых нет родительской <table>
-        for table in soup.find_all("table"):
-            if not table.find_parent("table"):
-                top_level_tables.append(str(table))  # Преобразуем обратно в HTML
+def iter_top_level_tables(soup: BeautifulSoup) -> Iterator[Tag]:
+    """Лениво перебирает верхнеуровневые таблицы в порядке документа"""
 
-        # Преобразуем верхнеуровневые таблицы в DataFrame
-        return [html_table_to_df(table) for table in top_level_tables]
+    table = soup.find('table')
+    while table is not None:
+        yield table
+        table = table.find_next('table')
+        # пропускаем таблицы, вложенные в только что выданную
+        while table is not None and table.find_parent('table') is not None:
+            table = table.find_next('table')
 
-    except Exception as e:
-        print(f"Ошибка при извлечении таблиц из HTML: {str(e)}")
-        return []
 
+_TABLE_TAG_REGEX = re.compile(r'<(/?)table\b', flags=re.IGNORECASE)
 
-# ------------------------------------------------------------------------------------------------------- postprocessing
 
-def split_html(html_content: str) -> list[str]:
-    regex = (r'(?:.*sent:.*$\s)(?:.*to:.*$\s)(?:.*cc:.*$\s)?(?:.*subject:.*$)'
-             r'|'
-             r'(?:.*отправлено:.*$\s)(?:.*кому:.*$\s)(?:.*копия:.*$\s)?(?:.*тема:.*$)')
+def _feed_lines(scanner: ReplyBoundaryScanner, html: str, start: int, end: int, chunk_size: int) -> Optional[int]:
+    """Подает html[start:end] кусками, заканчивающимися переводом строки; конец куска с заголовком ответа или None"""
+    while start < end:
+        stop = html.find('\n', min(start + chunk_size, end - 1), end)
+        stop = end if stop == -1 else stop + 1
+        if scanner.feed(html[start:stop]) is not None:
+            return stop
+        start = stop
+    return None
 
-    parts = re.split(regex, html_content, flags=re.IGNORECASE | re.MULTILINE)
 
-    return parts
+def find_last_message_prefix(html: str, chunk_size: int = 4096, margin: int = 4096) -> Optional[int]:
+    """
+    Длина начала html, которое заведомо содержит первый заголовок ответа: поиск по исходному html, без разбора
+    (текст вне верхнеуровневых таблиц, как в extract_last_message_spans), с запасом margin символов;
+    None - если заголовок ответа не найден
+    """
 
+    scanner = ReplyBoundaryScanner()
+    depth = 0
+    position = 0
+    found = None
+    for match in _TABLE_TAG_REGEX.finditer(html):
+        if match.group(1):
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                position = match.end()
+        else:
+            if depth == 0:
+                found = _feed_lines(scanner, html, position, match.start(), chunk_size)
+                if found is None and scanner.feed('\ntable\n') is not None:
+                    found = match.start()
+                if found is not None:
+                    break
+            depth += 1
+    else:
+        if depth == 0:
+            found = _feed_lines(scanner, html, position, len(html), chunk_size)
+    if found is None:
+        return None
+    stop = html.find('\n', found + margin)
+    return len(html) if stop == -1 else stop + 1
 
-# ---------------------------------------------------------------------------------------------------- postprocessing df
 
-def dataframe_is_table_rates(df: pd.DataFrame) -> bool:
+def extract_last_message_spans(soup: BeautifulSoup, partial: bool = False) -> Optional[HtmlSpans]:
     """
-    Проверяет, является ли DataFrame валидным по следующим критериям:
-    1) Состоит из 3 столбцов
-    2) Имена столбцов == FIELDS_ALIAS
+    Потоково заменяет верхнеуровневые таблицы на UUID и останавливается на первом заголовке ответа
+    (диалекты REPLY_HEADER_DIALECTS); таблицы после него не ищутся и не сериализуются;
+    Возвращает последнее письмо как HtmlSpans: его tables - tables_info таблиц последнего письма;
+    partial - soup разобран только из начала html: заголовок засчитывается, только если после него в начале
+    есть полные строки окна поиска, иначе None (нужен разбор всего html)
     """
 
-    if df.shape[1] != 3:
-        return False
+    text = str(soup)
+    scanner = ReplyBoundaryScanner()
+    tables_info = []
+    position = 0
+    boundary = None
+    for table in iter_top_level_tables(soup):
+        table_html = str(table)
+        find_ = text.find(table_html, position)
+        if find_ == -1:
+            continue
+        end = find_ + len(table_html) - 1
+        table_info = {'table': table_html, 'start': find_, 'end': end, 'node': table, '_id': str(uuid4())}
+        tables_info.append(table_info)
+        boundary = scanner.feed(text[position:find_] + '\n' + table_info['_id'] + '\n')
+        position = end + 1
+        if boundary is not None:
+            break
+    else:
+        boundary = scanner.feed(text[position:])
+        if boundary is None:
+            if partial:
+                return None  # конец начала html разобран не так, как в полном html - заголовок по нему не ищется
+            boundary = scanner.close()
+
+    spans = HtmlSpans(text, tables_info)
+    return spans if boundary is None else spans.cut(boundary)
 
-    return compare_fields_names(fields_alias=FIELDS_ALIAS,
-                                extracted_fields=list(df.columns))
 
+# ---------------------------------------------------------------------------------------------------------- rate tables
 
 def compare_fields_names(fields_alias: dict, extracted_fields: list) -> bool:
     extracted_fields = [x.lower().strip() for x in extracted_fields]
@@ -309,62 +488,71 @@ def compare_fields_names(fields_alias: dict, extracted_fields: list) -> bool:
     return len(extracted_fields) == 0
 
 
-def postprocess_df(df) -> pd.DataFrame | None:
+def rows_to_rate_table(rows: list[list[str]]) -> RateTable | None:
+    """
+    Строки таблицы ставок -> RateTable: строки со стоп-словами и без услуги отбрасываются,
+    ставка и вход приводятся к числам, наименование - к услуге 1С; None - если таблицу не удалось обработать
+    """
     try:
-        df.columns = [c.lower().strip() for c in df.columns]
-        df.columns = [FIELDS_ALIAS_REVERSED[x] for x in df.columns]  # приводим алиасы полей к изначальным наименованиям
-
-        df = remove_stopwords(df)
-        df['ставка'] = df['ставка'].apply(extract_first_number)
-        df['вход'] = df['вход'].apply(extract_number_from_entry)
-        df['наименование'] = df['наименование'].apply(lambda x: service_replace_by_service1C(x, SERVICES_KEYWORDS))
-        df = remove_false_name_rows(df)
-        return df
+        # приводим алиасы полей к изначальным наименованиям
+        columns = [FIELDS_ALIAS_REVERSED[c.lower().strip()] for c in rows[0]]
+        name_i, rate_i, entry_i = (columns.index(name) for name in RATE_COLUMNS)
+
+        table = RateTable(columns)
+        for row in rows[1:]:
+            row = row + [None] * (3 - len(row))
+            name = row[name_i]
+            if name is None or _STOPWORDS_REGEX.search(name):
+                continue
+            service = SERVICES_MATCHER.classify(name)
+            if not service:
+                continue
+            rate, entry = row[rate_i], row[entry_i]
+            table.append(service,
+                         None if rate is None else extract_first_number(rate),
+                         None if entry is None else extract_number_from_entry(entry))
+        return table
 
     except Exception:
         print(traceback.format_exc())
 
 
-def extract_first_number(text: str) -> float | None:
-    regex = r'^.*?(\d+(?:\.\d+)?).*$'
-    text = re.sub(r'[^\S\n]', '', text)  # удаление всех пробельных символов кроме \n
-    matches = re.findall(regex, text, flags=re.MULTILINE)
-    if matches:
-        return float(matches[0])
+# Число: первое в тексте (т.е. на первой строке, где есть цифры), пробелы внутри числа игнорируются;
+# Разделители тысяч - запятая или точка (группы по 3 цифры), десятичный разделитель - точка или запятая;
+# Одиночный разделитель перед ровно 3 цифрами - разделитель тысяч ("1,200" = 1200, "2.500" = 2500), кроме чисел
+# с ведущим нулем ("0,125" = 0.125); остальные одиночные - десятичные ("1,2" = 1.2), повторяющийся - тысяч
+_SPACES_REGEX = re.compile(r'[^\S\n]')  # все пробельные символы кроме \n
+# цифры вместе с пробелами и разделителями; разделитель с пробелом рядом ("100, 200") завершает число
+_NUMBER_TOKEN_REGEX = re.compile(r'(\d+(?:(?:[^\S\n]+|[.,])\d+)*)')
+_THOUSANDS_REGEX = re.compile(r'[1-9]\d{0,2}[.,]\d{3}')
+_NUMBER_REGEX = re.compile(r"""(
+    \d{1,3}(?:,\d{3})+\.\d+           # 1,200.50
+  | \d{1,3}(?:,\d{3}){2,}(?!\d)       # 1,200,000
+  | \d{1,3}(?:\.\d{3})+,\d+           # 1.200,50
+  | \d{1,3}(?:\.\d{3}){2,}(?!\d)      # 1.200.000
+  | \d+(?:[.,]\d+)?                   # 1200 / 1200.50 / 1200,50
+)""", flags=re.VERBOSE)
+
+
+def _number_to_float(number: str) -> float:
+    """Число из _NUMBER_REGEX -> float"""
+    if _THOUSANDS_REGEX.fullmatch(number):
+        return float(number[:-4] + number[-3:])
+    decimal_comma = number.count(',') == 1 and number.rfind(',') > number.rfind('.')
+    if decimal_comma or number.count('.') > 1:
+        number = number.replace('.', '')
+    return float(number.replace(',', '.' if decimal_comma else ''))
 
 
-def cut_text_before_last_equal(text: str) -> str:
-    last_equal = list(re.finditer(r'=', text))[-1]
-    return text[last_equal.start():]
+def extract_first_number(text: str) -> float | None:
+    token = _NUMBER_TOKEN_REGEX.search(text)
+    if token:
+        return _number_to_float(_NUMBER_REGEX.match(_SPACES_REGEX.sub('', token.group(1))).group(1))
 
 
 def extract_number_from_entry(text: str) -> float | None:
-    if '=' in text:
-        text = cut_text_before_last_equal(text)
-    return extract_first_number(text)
-
-
-def service_replace_by_service1C(service: str, keyword_dict: dict) -> str:
-    service_lower = service.lower()
-    for key_word, name1C in keyword_dict.items():
-        if key_word in service_lower:
-            return name1C
-    return ''
-
-
-def remove_false_name_rows(df):
-    """ Удаляет из DataFrame строки с пустым полем 'Наименование' """
-    return df[df['наименование'].apply(bool)]
-
-
-def remove_stopwords(df):
-    """ Удаляет из DataFrame строки, содержащие в 'Наименовании' стоп-слова """
-
-    # Создаем регулярное выражение из списка стопа-слов
-    pattern = '|'.join(STOPWORDS)
-    # Убираем строки, содержащие хотя бы одно стоп слово
-    df = df.copy()
-    return df[~df['наименование'].str.contains(pattern, case=False, na=True)]
+    """Число после последнего '=' (или первое число, если '=' нет)"""
+    return extract_first_number(text.rpartition('=')[2])
 
 
 # ---------------------------------------------------------------------------------------------------------------- other
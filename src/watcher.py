@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import ctypes
+import fnmatch
+import threading
+import ctypes.util
+from typing import List, Optional
+
+# inotify (Linux): события закрытия файла после записи и перемещения файла в папку
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """Функции inotify из libc или None, если система их не поддерживает"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FolderWatcher:
+    """
+    Следит за папкой и кладет в очередь пути готовых файлов, подходящих под pattern:
+    - Linux: inotify, реакция на закрытие файла после записи (IN_CLOSE_WRITE) и перемещение в папку (IN_MOVED_TO),
+      в простое поток спит в select без пробуждений;
+    - иначе (или use_inotify=False): опрос папки раз в poll_interval секунд;
+    Файл попадает в очередь, только если в течение debounce секунд он не менялся (копирование завершено);
+    Уже лежащие в папке файлы ставятся в очередь при запуске;
+    Пока файл в очереди или в обработке, повторно он не ставится; потребитель вызывает task_done(path)
+    после обработки; в обоих режимах файл снова ставится в очередь только после новой записи в него,
+    а файл, обработка которого не удалась (task_done(path, failed=True)), - повторно через retry_delay,
+    2 * retry_delay, ... секунд, не более max_retries раз
+    """
+
+    def __init__(self,
+                 folder: str,
+                 pattern: str = '*.msg',
+                 debounce: float = 0.5,
+                 poll_interval: float = 1.0,
+                 use_inotify: Optional[bool] = None,
+                 max_retries: int = 3,
+                 retry_delay: float = 60.0):
+        self.folder = os.path.abspath(folder)
+        self.pattern = pattern
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue: queue.Queue[str] = queue.Queue()
+
+        self._libc = _load_inotify() if use_inotify in (None, True) else None
+        if use_inotify and self._libc is None:
+            raise OSError('inotify недоступен')
+        self._queued: set[str] = set()  # в очереди или в обработке
+        self._failures: dict[str, int] = {}  # путь -> число неудачных обработок подряд
+        self._retries: dict[str, float] = {}  # путь -> время повторной постановки в очередь
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_pipe = os.pipe() if self.uses_inotify else None  # будит select в режиме inotify
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._libc is not None
+
+    # ------------------------------------------------------------------------------------------------------ public
+
+    def start(self) -> 'FolderWatcher':
+        if not self._running:
+            self._running = True
+            target = self._run_inotify if self.uses_inotify else self._run_polling
+            self._thread = threading.Thread(target=target, name='folder-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._running:
+            self._running = False
+            self._stop_event.set()
+            if self._wake_pipe:
+                os.write(self._wake_pipe[1], b'x')
+            self._thread.join()
+        if self._wake_pipe:
+            for fd in self._wake_pipe:
+                os.close(fd)
+            self._wake_pipe = None
+
+    def get_batch(self, timeout: Optional[float] = None) -> List[str]:
+        """Ждет первый готовый файл (не дольше timeout) и забирает вместе с ним все остальные из очереди"""
+        try:
+            paths = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                paths.append(self.queue.get_nowait())
+            except queue.Empty:
+                return paths
+
+    def task_done(self, path: str, failed: bool = False) -> None:
+        """Файл обработан; failed=True - обработка не удалась, файл остался в папке и будет поставлен повторно"""
+        with self._lock:
+            self._queued.discard(path)
+            if not failed:
+                self._failures.pop(path, None)
+                return
+            attempts = self._failures.get(path, 0) + 1
+            self._failures[path] = attempts
+            if attempts > self.max_retries:
+                print(f"Файл {path} не обработан, попыток: {attempts}; повтор - после изменения файла")
+                return
+            self._retries[path] = time.monotonic() + self.retry_delay * 2 ** (attempts - 1)
+        if self._wake_pipe:
+            os.write(self._wake_pipe[1], b'r')
+
+    def __enter__(self) -> 'FolderWatcher':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------------------------------------------ common
+
+    def _matches(self, name: str) -> bool:
+        return fnmatch.fnmatch(name.lower(), self.pattern.lower())
+
+    def _enqueue(self, path: str) -> None:
+        with self._lock:
+            if path in self._queued:
+                return
+            self._queued.add(path)
+        self.queue.put(path)
+
+    def _changed(self, path: str) -> None:
+        """В файл записали новое содержимое: счетчик неудачных обработок и запланированный повтор сбрасываются"""
+        with self._lock:
+            self._failures.pop(path, None)
+            self._retries.pop(path, None)
+
+    def _take_retries(self, until: float = float('inf')) -> dict[str, float]:
+        """Запланированные повторы со временем не позже until (забираются из расписания)"""
+        with self._lock:
+            due = {path: retry_at for path, retry_at in self._retries.items() if retry_at <= until}
+            for path in due:
+                del self._retries[path]
+        return due
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        """Подходящие файлы папки: путь -> (размер, время изменения)"""
+        files = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and self._matches(entry.name):
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    @staticmethod
+    def _is_unlocked(path: str) -> bool:
+        """Windows не дает открыть на запись файл, который еще копируется"""
+        try:
+            with open(path, 'ab'):
+                return True
+        except OSError:
+            return False
+
+    # ----------------------------------------------------------------------------------------------------- polling
+
+    def _run_polling(self) -> None:
+        previous = {}
+        stable_since: dict[str, float] = {}
+        enqueued: dict[str, tuple[int, int]] = {}  # путь -> (размер, время изменения) при постановке в очередь
+        while self._running:
+            current = self._scan()
+            now = time.monotonic()
+            for path, signature in current.items():
+                if previous.get(path) != signature:
+                    stable_since[path] = now  # файл еще пишется
+                elif (enqueued.get(path) != signature and now - stable_since[path] >= self.debounce
+                      and self._is_unlocked(path)):
+                    enqueued[path] = signature
+                    self._changed(path)
+                    self._enqueue(path)
+            for path in self._take_retries(until=now):
+                if path in current:
+                    self._enqueue(path)
+            for path in set(stable_since) - set(current):
+                del stable_since[path]
+                enqueued.pop(path, None)
+            previous = current
+            if self._stop_event.wait(self.poll_interval):
+                return
+
+    # ----------------------------------------------------------------------------------------------------- inotify
+
+    def _run_inotify(self) -> None:
+        libc = self._libc
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        try:
+            if libc.inotify_add_watch(fd, os.fsencode(self.folder), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch')
+
+            # путь -> время постановки в очередь; файлы, появившиеся до запуска, - через debounce
+            pending: dict[str, float] = {path: time.monotonic() + self.debounce for path in self._scan()}
+
+            while self._running:
+                pending.update(self._take_retries())
+                now = time.monotonic()
+                for path, enqueue_at in list(pending.items()):
+                    if enqueue_at <= now:
+                        del pending[path]
+                        if os.path.exists(path):
+                            self._enqueue(path)
+
+                timeout = min(pending.values(), default=None)
+                timeout = None if timeout is None else max(timeout - time.monotonic(), 0)
+                readable, _, _ = select.select([fd, self._wake_pipe[0]], [], [], timeout)
+                if self._wake_pipe[0] in readable:
+                    os.read(self._wake_pipe[0], 4096)  # остановка или новый повтор из task_done
+                    if not self._running:
+                        return
+                if fd in readable:
+                    for name, mask in self._read_events(fd):
+                        if mask & IN_Q_OVERFLOW:  # события потеряны - пересканировать папку
+                            pending.update({path: time.monotonic() + self.debounce for path in self._scan()})
+                        elif name and self._matches(name):
+                            path = os.path.join(self.folder, name)
+                            self._changed(path)
+                            pending[path] = time.monotonic() + self.debounce
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _read_events(fd: int) -> list[tuple[str, int]]:
+        events = []
+        while True:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(sys.getfilesystemencoding(), 'replace')
+                offset += length
+                events.append((name, mask))
+
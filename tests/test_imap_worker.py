@@ -0,0 +1,93 @@
+""" ImapWorker с локальной заменой IMAP-сервера: новые письма через IDLE и через опрос NOOP """
+
+import socket
+import imaplib
+import threading
+
+import pytest
+
+from src.logger import logger
+from src.imap_worker import ImapWorker
+
+
+class FakeImapServer:
+    """
+    Минимальный IMAP-сервер в отдельном потоке: LOGIN, SELECT, UID SEARCH, NOOP, IDLE, LOGOUT;
+    после начала IDLE (или на NOOP, если IDLE не поддерживается) в ящик приходит письмо UID 2
+    """
+
+    def __init__(self, idle: bool):
+        self.idle = idle
+        self.unseen = [1]
+        self.commands = []
+        self._sock = socket.create_server(('127.0.0.1', 0))
+        self.port = self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _arrive(self) -> bytes:
+        self.unseen.append(2)
+        return b'* 2 EXISTS\r\n'
+
+    def _serve(self) -> None:
+        connection, _ = self._sock.accept()
+        with connection, connection.makefile('rb') as file:
+            capabilities = b'IMAP4rev1 IDLE' if self.idle else b'IMAP4rev1'
+            connection.sendall(b'* OK [CAPABILITY ' + capabilities + b'] ready\r\n')
+            while line := file.readline():
+                tag, command, *args = line.split()
+                command = command.upper()
+                if command == b'UID':
+                    command = b'UID ' + args[0].upper()
+                self.commands.append(command.decode())
+                if command == b'SELECT':
+                    connection.sendall(b'* 1 EXISTS\r\n* OK [UIDVALIDITY 7] ok\r\n' + tag + b' OK [READ-WRITE] done\r\n')
+                elif command == b'UID SEARCH':
+                    uids = b' '.join(str(uid).encode() for uid in self.unseen)
+                    connection.sendall(b'* SEARCH ' + uids + b'\r\n' + tag + b' OK done\r\n')
+                elif command == b'IDLE':
+                    connection.sendall(b'+ idling\r\n' + self._arrive())
+                    file.readline()  # DONE
+                    connection.sendall(tag + b' OK IDLE terminated\r\n')
+                elif command == b'NOOP':
+                    connection.sendall((self._arrive() if 2 not in self.unseen else b'') + tag + b' OK done\r\n')
+                elif command == b'LOGOUT':
+                    connection.sendall(b'* BYE\r\n' + tag + b' OK done\r\n')
+                    return
+                else:
+                    connection.sendall(tag + b' OK done\r\n')
+
+    def connect(self, email_user: str, email_pass: str, imap_server: str, imap_port: int) -> imaplib.IMAP4:
+        mail = imaplib.IMAP4('127.0.0.1', self.port)
+        mail.login(email_user, email_pass)
+        mail.select('inbox')
+        return mail
+
+    def close(self) -> None:
+        self._sock.close()
+        self._thread.join(5)
+
+
+@pytest.mark.parametrize('idle', [True, False], ids=['IDLE', 'NOOP'])
+def test_new_message_is_dispatched(idle):
+    server = FakeImapServer(idle)
+    received = []
+
+    def handler(mail: imaplib.IMAP4, uids: list[bytes]) -> None:
+        received.append(uids)
+        if len(received) == 2:
+            worker.stop()
+
+    worker = ImapWorker('user', 'password', 'localhost', handler=handler, connect=server.connect,
+                        poll_interval=0.1, rescan_interval=3600)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    thread.join(10)
+    server.close()
+
+    assert not thread.is_alive()
+    assert received == [[b'1'], [b'2']]  # при старте сессии, затем только новое письмо
+    assert ('IDLE' in server.commands) == idle
+    assert ('NOOP' in server.commands) != idle
+    assert worker.uidvalidity == 7 and worker.last_uid == 2
+    assert 'Найдено новых писем: 1\n' in logger.data
@@ -0,0 +1,129 @@
+""" SmtpSender с локальным SMTP-сервером aiosmtpd: одно соединение, close(), повторы только при ответах 4xx """
+
+import socket
+import asyncio
+import smtplib
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from src.smtp_sender import SmtpSender
+
+
+class Handler:
+    """Принимает письма; адреса rejected отклоняются (550), письма для deferred первые n раз откладываются (451)"""
+
+    def __init__(self, rejected: tuple = (), deferred: dict = None, delay: float = 0):
+        self.rejected = rejected
+        self.deferred = dict(deferred or {})
+        self.delay = delay
+        self.rcpt = []
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        self.rcpt.append(address)
+        if address in self.rejected:
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        address = envelope.rcpt_tos[0]
+        if self.deferred.get(address):
+            self.deferred[address] -= 1
+            return '451 Try again later'
+        await asyncio.sleep(self.delay)
+        self.delivered.append(address)
+        return '250 Message accepted'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    """start(handler, **kwargs) -> (SmtpSender к запущенному aiosmtpd, список открытых отправителем соединений)"""
+    controllers = []
+    connections = []
+
+    def start(handler: Handler, **kwargs):
+        controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+        controller.start()
+        controllers.append(controller)
+
+        def factory(host: str, port: int) -> smtplib.SMTP:
+            connections.append((host, port))
+            return smtplib.SMTP(host, port)
+
+        sender = SmtpSender('robot@example.com', None, smtp_server=controller.hostname, smtp_port=controller.port,
+                            starttls=False, min_backoff=0.01, smtp_factory=factory, **kwargs)
+        return sender, connections
+
+    yield start
+    for controller in controllers:
+        controller.stop()
+
+
+def send(sender: SmtpSender, recipient: str) -> None:
+    assert sender.send('<p>ставки</p>', 'html', recipient, 'Автоответ')
+
+
+def test_messages_share_one_connection(smtp):
+    handler = Handler()
+    sender, connections = smtp(handler)
+    for i in range(5):
+        send(sender, f'client{i}@example.com')
+    sender.close()
+
+    assert handler.delivered == [f'client{i}@example.com' for i in range(5)]
+    assert len(connections) == 1
+    assert (sender.sent, sender.failed) == (5, 0)
+
+
+def test_close_flushes_queue(smtp):
+    handler = Handler(delay=0.02)
+    sender, _ = smtp(handler, workers=2)
+    for i in range(20):
+        send(sender, f'client{i}@example.com')
+    sender.close()  # письма еще в очереди - close() дожидается их отправки
+
+    assert sorted(handler.delivered) == sorted(f'client{i}@example.com' for i in range(20))
+    assert sender.sent == 20
+
+
+def test_permanent_error_is_not_retried(smtp):
+    handler = Handler(rejected=('nobody@example.com',))
+    sender, connections = smtp(handler, retries=3)
+    send(sender, 'nobody@example.com')
+    send(sender, 'client@example.com')
+    sender.close()
+
+    assert handler.rcpt.count('nobody@example.com') == 1
+    assert handler.delivered == ['client@example.com']
+    assert len(connections) == 1  # после отказа 5xx соединение используется дальше
+    assert (sender.sent, sender.failed) == (1, 1)
+
+
+def test_temporary_error_is_retried(smtp):
+    handler = Handler(deferred={'client@example.com': 2})
+    sender, connections = smtp(handler, retries=3)
+    send(sender, 'client@example.com')
+    sender.close()
+
+    assert handler.delivered == ['client@example.com']
+    assert len(connections) == 3  # после временной ошибки - переподключение
+    assert (sender.sent, sender.failed) == (1, 0)
+
+
+def test_temporary_error_gives_up_after_retries(smtp):
+    handler = Handler(deferred={'client@example.com': 10})
+    sender, connections = smtp(handler, retries=2)
+    send(sender, 'client@example.com')
+    sender.close()
+
+    assert handler.delivered == []
+    assert len(connections) == 3
+    assert (sender.sent, sender.failed) == (0, 1)
@@ -0,0 +1,80 @@
+""" FolderWatcher в режимах inotify и опроса папки: debounce, перемещение в папку, повторы после ошибок """
+
+import os
+import time
+
+import pytest
+
+from src.watcher import FolderWatcher, _load_inotify
+
+
+@pytest.fixture(params=['inotify', 'polling'])
+def watch(request, tmp_path):
+    """watch(**kwargs) -> запущенный FolderWatcher папки tmp_path/inbox (останавливается после теста)"""
+    if request.param == 'inotify' and _load_inotify() is None:
+        pytest.skip('inotify недоступен')
+    folder = tmp_path / 'inbox'
+    folder.mkdir()
+    watchers = []
+
+    def start(**kwargs) -> FolderWatcher:
+        watcher = FolderWatcher(str(folder), use_inotify=request.param == 'inotify', poll_interval=0.02, **kwargs)
+        watchers.append(watcher.start())
+        return watcher
+
+    yield start
+    for watcher in watchers:
+        watcher.stop()
+
+
+def collect(watcher: FolderWatcher, duration: float, failed: bool = False) -> list[tuple[float, str]]:
+    """(время от начала, имя файла) всех файлов, полученных за duration секунд; каждый сразу отмечается task_done"""
+    start = time.monotonic()
+    received = []
+    while (remaining := start + duration - time.monotonic()) > 0:
+        for path in watcher.get_batch(timeout=min(remaining, 0.02)):
+            received.append((time.monotonic() - start, os.path.basename(path)))
+            watcher.task_done(path, failed=failed)
+    return received
+
+
+def test_half_written_file_waits_for_debounce(watch):
+    watcher = watch(debounce=0.3)
+    path = os.path.join(watcher.folder, 'rates.msg')
+    for _ in range(8):  # копирование кусками дольше debounce: файл закрывается и дописывается снова
+        with open(path, 'ab') as file:
+            file.write(b'x' * 1024)
+        time.sleep(0.05)
+        assert watcher.queue.empty()
+
+    received = collect(watcher, 1.0)  # начат через 0.05 с после последней записи
+    assert [name for _, name in received] == ['rates.msg']  # один раз, а не на каждую запись
+    assert received[0][0] >= 0.3 - 0.05
+
+
+def test_moved_in_file_is_queued(watch, tmp_path):
+    watcher = watch(debounce=0.05)
+    for name in ('rates.msg', 'rates.tmp'):
+        outside = tmp_path / name
+        outside.write_bytes(b'message')
+        os.rename(outside, os.path.join(watcher.folder, name))  # IN_MOVED_TO, без IN_CLOSE_WRITE в папке
+
+    assert [name for _, name in collect(watcher, 0.5)] == ['rates.msg']
+
+
+def test_failed_file_is_retried_with_backoff(watch):
+    watcher = watch(debounce=0.05, max_retries=2, retry_delay=0.2)
+    path = os.path.join(watcher.folder, 'rates.msg')
+    with open(path, 'wb') as file:
+        file.write(b'message')
+
+    times = [t for t, _ in collect(watcher, 1.5, failed=True)]
+    assert len(times) == 3  # первая обработка и max_retries повторов
+    assert times[1] - times[0] >= 0.2
+    assert times[2] - times[1] >= 0.4  # задержка удваивается
+
+    # после исчерпания повторов файл ставится в очередь только после новой записи
+    with open(path, 'wb') as file:
+        file.write(b'new message')
+    assert [name for _, name in collect(watcher, 0.5)] == ['rates.msg']
+    assert collect(watcher, 0.3) == []